@@ -1,15 +1,24 @@
 """Running the Flask app"""
 import logging.config
+import os
 import traceback
 import yaml
 import pandas as pd
-from flask import Flask, render_template, request
+import sqlalchemy.exc
+from flask import Flask, render_template, request, jsonify
 from config.flaskconfig import MaritalStatus, Gender, OverTime
 
 
 # For setting up the Flask-SQLAlchemy database session
-from src.employee_db import EmployeeManager
-from src.predict import transform_input, prediction
+from src.batching import MicroBatcher
+from src.drift import DriftMonitor
+from src.employee_db import EmployeeManager, FILTER_COLUMNS
+from src.predict import EmployeeRecord, row_encoder
+from src.registry import ModelStore
+from src.results import ResultsFile
+from src.explain import ExplainerCache, top_contributions
+from src.model import encode_features
+from src.serving import ModelRouter, feature_columns, version_name
 
 # Initialize the Flask application
 
@@ -24,8 +33,44 @@ logging.config.fileConfig(app.config["LOGGING_CONFIG"])
 logger = logging.getLogger(app.config["APP_NAME"])
 logger.debug('Web app log')
 
+# Scored employees are appended to the local results file
+results_file = ResultsFile(app.config['RESULTS_PATH'])
+
 # Initialize the database session
 employee_manager = EmployeeManager(app)
+employee_manager.count_ttl = app.config['COUNT_CACHE_TTL']
+employee_manager.count_cache_size = app.config['COUNT_CACHE_SIZE']
+
+# Serve the promoted model version, swapping to newly promoted versions without a restart
+model_store = ModelStore(app.config['MODEL_REGISTRY'], fallback_path=app.config['MODEL_PATH'],
+                         check_interval=app.config['MODEL_CHECK_INTERVAL'])
+
+# Route a share of requests to the candidate version and shadow-score the other model
+candidate_store = None
+if app.config['CANDIDATE_MODEL_VERSION']:
+    candidate_store = ModelStore(app.config['MODEL_REGISTRY'], version=app.config['CANDIDATE_MODEL_VERSION'])
+
+# Score concurrent requests together in one model call
+batcher = None
+if app.config['MICRO_BATCH_MAX_SIZE'] > 1:
+    batcher = MicroBatcher(max_batch_size=app.config['MICRO_BATCH_MAX_SIZE'],
+                           max_wait_ms=app.config['MICRO_BATCH_MAX_WAIT_MS'])
+model_router = ModelRouter(model_store, candidate_store,
+                           candidate_percent=app.config['CANDIDATE_TRAFFIC_PERCENT'],
+                           max_workers=app.config['SHADOW_MAX_WORKERS'],
+                           max_pending=app.config['SHADOW_MAX_PENDING'],
+                           batcher=batcher)
+
+# Per-prediction explanations, one explainer per served model version
+explainers = ExplainerCache(cache_size=app.config['EXPLAIN_CACHE_SIZE'])
+
+# Histograms of app inputs compared with the training data
+drift_monitor = None
+if os.path.exists(app.config['DRIFT_PROFILE']):
+    drift_monitor = DriftMonitor.from_file(app.config['DRIFT_PROFILE'],
+                                           psi_threshold=app.config['DRIFT_PSI_THRESHOLD'])
+else:
+    logger.warning("No reference profile at %s, drift monitoring is off", app.config['DRIFT_PROFILE'])
 
 # load yaml configuration file
 try:
@@ -65,37 +110,32 @@ def add_entry():
     if request.method == 'GET':
         return "Visit the homepage to add applicants and get predictions"
 
-    df = pd.read_csv('data/raw/employee_results.csv')
-    number = max(df['EmployeeNumber']) + 1
+    try:
+        record = EmployeeRecord.from_form(request.form)
+    except (KeyError, ValueError):
+        logger.warning("Not able to read the submitted employee, error page returned")
+        return render_template('error.html')
 
     try:
-        logger.info(
-            "New applicant of Employee ID %s added",
-            number
-        )
+        # Get attrition prediction for the new employee
+        label, prob, served = model_router.score(record)
+        version = version_name(served)
+        user_input = record.to_dict()
+        if drift_monitor is not None:
+            drift_monitor.update(user_input)
 
-        # Get loan delinquency prediction for the new applicant
-        user_input = {'EmployeeNumber': number,
-                      'EnvironmentSatisfaction': int(request.form['EnvironmentSatisfaction']),
-                      'JobInvolvement': int(request.form['JobInvolvement']),
-                      'JobLevel': int(request.form['JobLevel']),
-                      'JobSatisfaction': int(request.form['JobSatisfaction']),
-                      'PerformanceRating': int(request.form['PerformanceRating']),
-                      'RelationshipSatisfaction': int(request.form['RelationshipSatisfaction']),
-                      'WorkLifeBalance': int(request.form['WorkLifeBalance']),
-                      'YearsSinceLastPromotion': int(request.form['YearsSinceLastPromotion']),
-                      'MaritalStatus': request.form['MaritalStatus'],
-                      'Gender': request.form['Gender'],
-                      'OverTime': request.form['OverTime']}
-
-        # get transformed input and prediction
-        user_input_new = transform_input(user_input)
-        label = prediction(user_input_new)[0]
-        prob = prediction(user_input_new)[1]
+        # features that moved this prediction the most
+        try:
+            explainer = explainers.get(version, served.model, feature_columns(served))
+            row = row_encoder(tuple(explainer.feature_columns)).encode(record)
+            factors = top_contributions(explainer.explain_one(row[0]), app.config['EXPLAIN_TOP_N'])
+        except ValueError:
+            logger.warning("Not able to explain the prediction of model version %s", version, exc_info=True)
+            factors = []
 
         logger.info(
             "The employee's probability of attrition is: %f, "
-            "hence %s", prob, label
+            "hence %s (model version %s)", prob, label, version
         )
 
         if label == "the employee is not likely to leave":
@@ -103,41 +143,156 @@ def add_entry():
         else:
             attr = 'Yes'
 
+        number = results_file.append(user_input)
+        logger.info(
+            "New applicant of Employee ID %s added to the local file",
+            number
+        )
+
         try:
             # Add new applicant information to RDS for future usages
-            employee_manager.add_employee(
-                EmployeeNumber=number,
-                EnvironmentSatisfaction=int(request.form['EnvironmentSatisfaction']),
-                JobInvolvement=int(request.form['JobInvolvement']),
-                JobLevel=int(request.form['JobLevel']),
-                JobSatisfaction=int(request.form['JobSatisfaction']),
-                PerformanceRating=int(request.form['PerformanceRating']),
-                RelationshipSatisfaction=int(request.form['RelationshipSatisfaction']),
-                WorkLifeBalance=int(request.form['WorkLifeBalance']),
-                YearsSinceLastPromotion=int(request.form['YearsSinceLastPromotion']),
-                MaritalStatus=request.form['MaritalStatus'],
-                Gender=request.form['Gender'],
-                OverTime=request.form['OverTime'],
-                Attrition=attr
-            )
+            employee_manager.add_employee(EmployeeNumber=number, Attrition=attr, ModelVersion=version,
+                                          **user_input)
             logger.info('New Employee added to the database')
         except ConnectionError:
             logger.error('Cannot add employee added to the database, check your database connection')
-        except:
-            logger.error('Cannot add employee added to the database, the employee might already exist in the '
-                         'database')
-
-        df_new = df.append(user_input, ignore_index=True)
-        df_new.to_csv('data/raw/employee_results.csv', index=False)
-        logger.info('New Employee added to the local file')
+        except sqlalchemy.exc.SQLAlchemyError:
+            logger.error('Cannot add employee %s to the database', number, exc_info=True)
 
         logger.debug("Result page accessed")
-        return render_template('result.html', prob=prob, label=label)
-    except RuntimeError:
+        return render_template('result.html', prob=prob, label=label, factors=factors)
+    except (RuntimeError, ValueError):
         logger.warning("Not able to process your request, error page returned")
         return render_template('error.html')
 
 
+@app.route('/batch', methods=['POST'])
+def batch():
+    """Score a batch of employees posted as a JSON list of records with the fields of the main page
+    Add `?explain=true` for the contribution of every feature to each prediction
+    Returns:
+        JSON list with the attrition probability, label and model version of each employee,
+        or an error message with status 400 if the records cannot be scored
+    """
+    records = request.get_json(silent=True)
+    if not isinstance(records, list) or not records:
+        return jsonify({'error': 'Expected a non-empty JSON list of employee records'}), 400
+
+    try:
+        for record in records:
+            EmployeeRecord(**record)
+        records_df = pd.DataFrame(records)
+        probs, labels, served = model_router.score_batch(records_df)
+        version = version_name(served)
+        results = [{'probability': round(float(prob), 2),
+                    'label': 'Yes' if label == 1 else 'No',
+                    'model_version': version} for prob, label in zip(probs, labels)]
+
+        if request.args.get('explain', '').lower() == 'true':
+            columns = feature_columns(served)
+            explainer = explainers.get(version, served.model, columns)
+            contributions = explainer.explain(encode_features(records_df, columns))
+            for result, (_, row) in zip(results, contributions.iterrows()):
+                result['contributions'] = row.round(4).to_dict()
+
+        if drift_monitor is not None:
+            for record in records:
+                drift_monitor.update(record)
+    except (KeyError, ValueError, TypeError):
+        logger.warning("Not able to score the batch of %s employees", len(records), exc_info=True)
+        return jsonify({'error': 'Records must contain every employee field of the main page, '
+                                 'with one of its answers'}), 400
+
+    logger.info("Scored a batch of %s employees with model version %s", len(records), version)
+    return jsonify(results)
+
+
+def employee_filters() -> dict:
+    """Read the Employee column filters of a request's query string, e.g. ?Attrition=Yes&JobLevel=2"""
+    filters = {column: request.args[column] for column in FILTER_COLUMNS if column in request.args}
+    if 'JobLevel' in filters:
+        filters['JobLevel'] = int(filters['JobLevel'])
+    return filters
+
+
+@app.route('/employees', methods=['GET'])
+def employees():
+    """Page through scored employees, filtered by the columns in the query string
+    Pass the returned `next_after` as `?after=` to get the next page; `limit` is capped at MAX_ROWS_SHOW
+    Returns:
+        JSON with the employees of the page and the cursor of the next page,
+        or an error message with status 400 for invalid parameters
+    """
+    try:
+        filters = employee_filters()
+        after = request.args.get('after', type=int)
+        limit = min(request.args.get('limit', app.config['MAX_ROWS_SHOW'], type=int), app.config['MAX_ROWS_SHOW'])
+        rows, next_after = employee_manager.query_employees(filters, after=after, limit=max(limit, 1))
+    except ValueError:
+        return jsonify({'error': 'Filters must be among %s, JobLevel an integer' % ', '.join(FILTER_COLUMNS)}), 400
+
+    logger.debug("Employees page after %s with %s rows returned", after, len(rows))
+    return jsonify({'employees': rows, 'next_after': next_after})
+
+
+@app.route('/employees/counts', methods=['GET'])
+def employee_counts():
+    """Number of scored employees per value of `?by=` (default Attrition), filtered like /employees
+    Returns:
+        JSON with the count per value, null for employees without one,
+        or an error message with status 400 for invalid parameters
+    """
+    column = request.args.get('by', 'Attrition')
+    try:
+        counts = employee_manager.count_by(column, employee_filters())
+    except ValueError:
+        return jsonify({'error': 'Columns must be among %s, JobLevel an integer' % ', '.join(FILTER_COLUMNS)}), 400
+    return jsonify({'by': column, 'counts': [{'value': value, 'count': count} for value, count in counts.items()]})
+
+
+@app.route('/importance', methods=['GET'])
+def importance():
+    """Global feature importance of the served model, the same as written by the train step
+    Returns:
+        JSON with the model version and its features by decreasing importance,
+        or an error message with status 404 if the served model has no column names
+    """
+    try:
+        served = model_store.get()
+        version = version_name(served)
+        explainer = explainers.get(version, served.model, feature_columns(served))
+    except (RuntimeError, ValueError):
+        logger.warning("No feature importance for the served model", exc_info=True)
+        return jsonify({'error': 'The served model has no feature importance'}), 404
+    return jsonify({'model_version': version,
+                    'importance': [{'feature': feature, 'importance': float(value)}
+                                   for feature, value in explainer.importances.items()]})
+
+
+@app.route('/drift', methods=['GET'])
+def drift():
+    """Drift of the inputs scored since startup against the training data
+    Returns:
+        JSON with the PSI (and KS for ordinal features) of each feature and the drifted features,
+        or an error message with status 404 if no reference profile is loaded
+    """
+    if drift_monitor is None:
+        return jsonify({'error': 'No reference profile at %s' % app.config['DRIFT_PROFILE']}), 404
+    return jsonify(drift_monitor.report())
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Serving statistics of the current and candidate models, micro-batching and input drift
+    Returns:
+        JSON with the latency per model version, the shadow disagreement rate, the batch sizes and queue
+        waits of micro-batching and the drift report
+    """
+    return jsonify({'serving': model_router.metrics.snapshot(),
+                    'batching': batcher.metrics.snapshot() if batcher is not None else None,
+                    'drift': drift_monitor.report() if drift_monitor is not None else None})
+
+
 @app.route('/about', methods=['GET'])
 def about():
     """'About' page with information about the project and creater
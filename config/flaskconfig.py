@@ -6,7 +6,36 @@ APP_NAME = "Employee-Attrition-Prediction"
 SQLALCHEMY_TRACK_MODIFICATIONS = True
 HOST = "0.0.0.0"
 SQLALCHEMY_ECHO = False  # If true, SQL for queries made will be printed
-MAX_ROWS_SHOW = 100
+MAX_ROWS_SHOW = 100  # largest page of employees returned by /employees
+COUNT_CACHE_TTL = 30  # seconds aggregate counts of /employees/counts are reused
+COUNT_CACHE_SIZE = 256  # most distinct /employees/counts queries kept in the cache
+
+# Local files used by the app
+RESULTS_PATH = os.environ.get('RESULTS_PATH', 'data/raw/employee_results.csv')
+MODEL_PATH = os.environ.get('MODEL_PATH', 'models/rf.joblib')
+
+# Versioned models; the app serves the version promoted to current, MODEL_PATH until one is promoted
+MODEL_REGISTRY = os.environ.get('MODEL_REGISTRY', 'models/versions')
+MODEL_CHECK_INTERVAL = 1.0  # seconds between checks for a newly promoted model version
+
+# Candidate model version scored next to the current one; shadow scoring and A/B serving are off if unset
+CANDIDATE_MODEL_VERSION = os.environ.get('CANDIDATE_MODEL_VERSION')
+CANDIDATE_TRAFFIC_PERCENT = float(os.environ.get('CANDIDATE_TRAFFIC_PERCENT', 0))  # served by the candidate
+SHADOW_MAX_WORKERS = 2
+SHADOW_MAX_PENDING = 100  # shadow calls queued before further ones are skipped
+
+# Micro-batching of concurrent /result predictions into one model call, off if the batch size is 1
+MICRO_BATCH_MAX_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', 1))
+# longest wait for a batch to fill; at 0 only requests already queued are batched together
+MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get('MICRO_BATCH_MAX_WAIT_MS', 0.0))
+
+# Explanations of predictions
+EXPLAIN_TOP_N = 3  # features shown on the result page
+EXPLAIN_CACHE_SIZE = 1024  # explained inputs kept per model version
+
+# Drift of app inputs against the training data, off if the profile is missing
+DRIFT_PROFILE = os.environ.get('DRIFT_PROFILE', 'models/drift_profile.json')
+DRIFT_PSI_THRESHOLD = 0.2  # PSI above which a feature is reported as drifted
 
 # Engine string
 DB_HOST = os.environ.get('MYSQL_HOST')
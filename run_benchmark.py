@@ -0,0 +1,63 @@
+"""Benchmark pipeline for the project"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+import yaml
+
+import src.benchmark as benchmark
+
+logging.basicConfig(format='%(name)-12s %(levelname)-8s %(message)s', level=logging.INFO)
+logger = logging.getLogger('AVC-project-benchmark')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the model pipeline on synthetic employee data")
+    parser.add_argument('--config', default='config/config.yaml', help='Path to configuration file')
+    parser.add_argument('--sizes', nargs='+', type=int, help='Numbers of synthetic rows; overrides the config')
+    parser.add_argument('--output', help='Output file path of the benchmark results')
+    parser.add_argument('--baseline', help='Path of the baseline results to compare against')
+    parser.add_argument('--save_baseline', action='store_true',
+                        help='Store the results as the new baseline instead of comparing')
+
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    logger.info('Configuration file loaded')
+
+    bench_config = config['benchmark']
+    output_path = args.output or bench_config['output']
+    baseline_path = args.baseline or bench_config['baseline']
+
+    results = benchmark.run_benchmarks(args.sizes or bench_config['sizes'],
+                                       config['model']['clean_data'],
+                                       config['model']['split_data'],
+                                       config['model']['train_model'],
+                                       random_state=bench_config['random_state'],
+                                       missing_rate=bench_config['missing_rate'],
+                                       latency_calls=bench_config['latency_calls'],
+                                       max_rows=bench_config['max_rows'],
+                                       ingest_config=config['ingest'])
+
+    for path in [output_path] + ([baseline_path] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        logger.info('benchmark results saved to %s', path)
+
+    if not args.save_baseline:
+        try:
+            with open(baseline_path, 'r') as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            logger.warning('No baseline found at %s, run with --save_baseline to create one', baseline_path)
+            sys.exit(0)
+
+        regressions = benchmark.compare_to_baseline(results, baseline, bench_config['tolerance'])
+        if regressions:
+            for regression in regressions:
+                logger.error('Regression %s', regression)
+            sys.exit(1)
+        logger.info('No regressions beyond %.0f%% of the baseline', bench_config['tolerance'] * 100)
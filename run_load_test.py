@@ -0,0 +1,68 @@
+"""Load test of the Flask app, in-process against SQLite or against a running app"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+import yaml
+
+import src.load_test as load_test
+
+logging.basicConfig(format='%(name)-12s %(levelname)-8s %(message)s', level=logging.INFO)
+logger = logging.getLogger('AVC-project-load-test')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the employee attrition app")
+    parser.add_argument('--config', default='config/config.yaml', help='Path to configuration file')
+    parser.add_argument('--base_url', help='Address of a running app, e.g. http://127.0.0.1:5000; '
+                                           'the app is run in-process against SQLite if omitted')
+    parser.add_argument('--requests', type=int, help='Total number of requests')
+    parser.add_argument('--concurrency', type=int, help='Number of concurrent workers')
+    parser.add_argument('--results_path', help='Results file written by a running app, for the consistency check')
+    parser.add_argument('--engine_string', help='Database of a running app, for the consistency check')
+    parser.add_argument('--output', help='Output file path of the load test report')
+
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    logger.info('Configuration file loaded')
+    load_config = config['load_test']
+
+    if args.base_url:
+        client = load_test.HttpClient(args.base_url)
+        results_path = args.results_path
+        engine_string = args.engine_string
+    else:
+        # run the app against a scratch copy of the results file and a SQLite stand-in database
+        work_dir = tempfile.mkdtemp(prefix='load_test_')
+        results_path = os.path.join(work_dir, 'employee_results.csv')
+        shutil.copy(config['rds'], results_path)
+        engine_string = 'sqlite:///%s' % os.path.join(work_dir, 'employee.db')
+        os.environ['RESULTS_PATH'] = results_path
+        os.environ['SQLALCHEMY_DATABASE_URI'] = engine_string
+
+        from src.employee_db import create_db
+        create_db(engine_string)
+        from app import app as flask_app
+        client = load_test.InProcessClient(flask_app)
+        logger.info('Running the app in-process with scratch files in %s', work_dir)
+
+    rows_before = len(pd.read_csv(results_path)) if results_path else None
+
+    report = load_test.run_load_test(client, load_config['mix'],
+                                     args.requests or load_config['requests'],
+                                     args.concurrency or load_config['concurrency'],
+                                     random_state=load_config['random_state'])
+    if results_path:
+        report['consistency'] = load_test.check_consistency(results_path, rows_before,
+                                                            report['successful_posts'], engine_string)
+
+    output_path = args.output or load_config['output']
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info('load test report saved to %s', output_path)
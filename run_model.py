@@ -1,13 +1,19 @@
 """Model pipeline for the project"""
 import argparse
+import json
 import logging
+import os
+import resource
 
 import joblib
 import yaml
 import pandas as pd
 import numpy as np
 
+import src.drift as drift
+import src.evaluate as evaluate
 import src.model as model
+import src.registry as registry
 
 logging.basicConfig(format='%(name)-12s %(levelname)-8s %(message)s', level=logging.DEBUG)
 logger = logging.getLogger('AVC-project-modelling')
@@ -30,17 +36,33 @@ if __name__ == '__main__':
     sp_clean.add_argument('--config', default='config/config.yaml', help='Path to configuration file')
     sp_clean.add_argument('--output', help='Output file path')
 
+    # Sub-parser for profiling the training data
+    sp_profile = subparsers.add_parser("profile", description="histogram the training data for drift monitoring")
+    sp_profile.add_argument("--input", help="input file path")
+    sp_profile.add_argument('--config', default='config/config.yaml', help='Path to configuration file')
+    sp_profile.add_argument('--output', help='Output file path')
+
     # Sub-parser for splitting data
     sp_split = subparsers.add_parser("split", description="split data")
     sp_split.add_argument("--input", help="input file path")
     sp_split.add_argument('--config', default='config/config.yaml', help='Path to configuration file')
     sp_split.add_argument('--output', nargs='+', help='Output file path')
+    sp_split.add_argument('--npy_output', nargs=2,
+                          help='Output paths of the memory-mapped float32 X_train and y_train for training')
 
     # Sub-parser for training model
     sp_train = subparsers.add_parser("train", description="train model")
     sp_train.add_argument("--input", nargs='+', help="input file path")
     sp_train.add_argument('--config', default='config/config.yaml', help='Path to configuration file')
     sp_train.add_argument('--output', help='Output file path')
+    sp_train.add_argument('--importance_output', help='Output path of the global feature importance')
+
+    # Sub-parser for cross-validating model
+    sp_cv = subparsers.add_parser("cv", description="cross-validate model")
+    sp_cv.add_argument("--input", nargs='+', help="input file path")
+    sp_cv.add_argument('--config', default='config/config.yaml', help='Path to configuration file')
+    sp_cv.add_argument('--output', help='Output file path')
+    sp_cv.add_argument('--oof_output', help='Output path of the out-of-fold predicted probabilities')
 
     # Sub-parser for scoring model
     sp_score = subparsers.add_parser("score", description="score model")
@@ -53,6 +75,30 @@ if __name__ == '__main__':
     sp_evaluate.add_argument("--input", nargs='+', help="input file path")
     sp_evaluate.add_argument('--config', default='config/config.yaml', help='Path to configuration file')
     sp_evaluate.add_argument('--output', help='Output file path')
+    sp_evaluate.add_argument('--metrics_output', help='Output path of the metrics and confidence intervals (json)')
+    sp_evaluate.add_argument('--curve_output', help='Output path of the metrics at every threshold (csv)')
+
+    # Sub-parser for refreshing the model with new employee records
+    sp_retrain = subparsers.add_parser("retrain", description="add trees fitted on new employee records")
+    sp_retrain.add_argument("--input", nargs='+', help="input file path")
+    sp_retrain.add_argument('--config', default='config/config.yaml', help='Path to configuration file')
+    sp_retrain.add_argument('--output', help='Output file path')
+    sp_retrain.add_argument('--labels', help='csv of observed Attrition per EmployeeNumber of app-scored employees')
+    sp_retrain.add_argument('--publish', metavar='REGISTRY',
+                            help='Publish and promote the refreshed model in this registry, e.g. models/versions')
+
+    # Sub-parser for publishing a model version
+    sp_publish = subparsers.add_parser("publish", description="publish model, preprocessor and metrics as a version")
+    sp_publish.add_argument("--input", nargs='+', help="model path, training data path, then evaluation outputs")
+    sp_publish.add_argument('--config', default='config/config.yaml', help='Path to configuration file')
+    sp_publish.add_argument('--output', default='models/versions', help='Model registry directory')
+    sp_publish.add_argument('--promote', action='store_true', help='Serve the new version right away')
+
+    # Sub-parser for promoting (or rolling back to) a model version
+    sp_promote = subparsers.add_parser("promote", description="serve a published model version")
+    sp_promote.add_argument("--version", help="version to serve; the previous version if omitted")
+    sp_promote.add_argument('--config', default='config/config.yaml', help='Path to configuration file')
+    sp_promote.add_argument('--output', default='models/versions', help='Model registry directory')
 
     args = parser.parse_args()
     sp_used = args.subparser_name
@@ -83,6 +129,13 @@ if __name__ == '__main__':
         output.to_csv(args.output, index=False)
         logger.info('processed data saved to %s', args.output)
 
+    elif sp_used == 'profile':
+        ingest = pd.read_csv(args.input)
+        output = drift.build_profile(ingest, **config['model']['profile'])
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+        logger.info('reference profile saved to %s', args.output)
+
     elif sp_used == 'split':
         try:
             ingest = pd.read_csv(args.input)
@@ -102,22 +155,67 @@ if __name__ == '__main__':
         logger.info('y_train saved to %s', args.output[2])
         output[3].to_pickle(args.output[3])
         logger.info('y_test saved to %s', args.output[3])
+        if args.npy_output:
+            model.save_feature_matrix(output[0], output[2], args.npy_output[0], args.npy_output[1])
+            logger.info('memory-mapped X_train and y_train saved to %s and %s', *args.npy_output)
 
     elif sp_used == 'train':
-        try:
-            ingest1 = pd.read_csv(args.input[0])
-            logger.debug('data loaded')
-        except FileNotFoundError:
-            logger.error('File not found at path %s', args.input)
-        except pd.errors.EmptyDataError:
-            logger.error('No data')
-        except pd.errors.ParserError:
-            logger.error('Parse error')
+        if os.path.splitext(args.input[0])[1] == '.npy':
+            # memory-mapped float32 matrix from split --npy_output, used by sklearn without copies
+            ingest1, ingest2 = model.load_feature_matrix(args.input[0], args.input[1])
+            feature_columns = model.load_feature_columns(args.input[0])
+            logger.debug('data memory-mapped')
+        else:
+            try:
+                ingest1 = pd.read_csv(args.input[0])
+                logger.debug('data loaded')
+            except FileNotFoundError:
+                logger.error('File not found at path %s', args.input)
+            except pd.errors.EmptyDataError:
+                logger.error('No data')
+            except pd.errors.ParserError:
+                logger.error('Parse error')
 
-        ingest2 = pd.read_pickle(args.input[1])
+            ingest2 = pd.read_pickle(args.input[1])
+            feature_columns = list(ingest1.columns)
         output = model.train_model(ingest1, ingest2, **config['model']['train_model'])
+        # ru_maxrss is reported in kilobytes on Linux
+        logger.info('peak RSS during training: %.1f MB', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
         joblib.dump(output, args.output)
         logger.info('random forest model saved to %s', args.output)
+        if feature_columns is not None:
+            # the app serves and explains the model with these columns
+            model.save_feature_columns(feature_columns, args.output)
+            logger.info('training columns saved to %s', model.feature_columns_path(args.output))
+        if args.importance_output and feature_columns is not None:
+            model.feature_importance(output, feature_columns).to_csv(args.importance_output, index=False)
+            logger.info('feature importance saved to %s', args.importance_output)
+        elif args.importance_output:
+            logger.warning('No column names saved with %s, feature importance not saved', args.input[0])
+
+    elif sp_used == 'cv':
+        if os.path.splitext(args.input[0])[1] == '.npy':
+            ingest1, ingest2 = model.load_feature_matrix(args.input[0], args.input[1])
+            logger.debug('data memory-mapped')
+        else:
+            try:
+                ingest1 = pd.read_csv(args.input[0])
+                logger.debug('data loaded')
+            except FileNotFoundError:
+                logger.error('File not found at path %s', args.input)
+            except pd.errors.EmptyDataError:
+                logger.error('No data')
+            except pd.errors.ParserError:
+                logger.error('Parse error')
+
+            ingest2 = pd.read_pickle(args.input[1])
+        output = model.cross_validate(ingest1, ingest2, train_config=config['model']['train_model'],
+                                      **config['model']['cross_validate'])
+        output[0].to_csv(args.output)
+        logger.info('cross-validation results saved to %s', args.output)
+        if args.oof_output:
+            np.save(args.oof_output, output[1])
+            logger.info('out-of-fold predicted probability saved to %s', args.oof_output)
 
     elif sp_used == 'score':
         try:
@@ -152,3 +250,71 @@ if __name__ == '__main__':
         output = model.evaluation(ingest1, ingest2, ingest3)
         output.to_csv(args.output)
         logger.info('confusion matrix saved to %s', args.output)
+
+        if args.metrics_output or args.curve_output:
+            # memory-map the scores so files larger than memory are streamed
+            summary, curve = evaluate.evaluate_scores(evaluate.load_scores(args.input[0]),
+                                                      evaluate.load_scores(args.input[1]),
+                                                      **config['model']['evaluate'])
+            if args.metrics_output:
+                with open(args.metrics_output, 'w') as f:
+                    json.dump(summary, f, indent=2)
+                logger.info('metrics saved to %s', args.metrics_output)
+            if args.curve_output:
+                curve.to_csv(args.curve_output, index=False)
+                logger.info('threshold sweep saved to %s', args.curve_output)
+
+    elif sp_used == 'retrain':
+        retrain_config = dict(config['model']['retrain'])
+        watermark_path = retrain_config.pop('watermark_path')
+        try:
+            with open(watermark_path, 'r') as f:
+                watermark = json.load(f)['EmployeeNumber']
+        except FileNotFoundError:
+            # the first model has seen every employee of the raw training data
+            watermark = int(pd.read_csv(config['model']['get_data']['file'])['EmployeeNumber'].max())
+            logger.warning('No watermark at %s, starting after EmployeeNumber %s', watermark_path, watermark)
+
+        ingest1 = joblib.load(args.input[0])
+        ingest2 = pd.read_csv(args.input[1])
+        ingest3 = pd.read_csv(args.input[2])
+        ingest4 = pd.read_pickle(args.input[3])
+        labels = pd.read_csv(args.labels) if args.labels else None
+        output, watermark, result = model.incremental_train(ingest1, ingest2, ingest3, ingest4, watermark,
+                                                            labels=labels, **retrain_config)
+        if output is not None:
+            # write next to the target and rename so readers never see a half-written model
+            joblib.dump(output, args.output + '.tmp')
+            os.replace(args.output + '.tmp', args.output)
+            model.save_feature_columns(list(ingest3.columns), args.output)
+            logger.info('refreshed random forest model saved to %s', args.output)
+            with open(watermark_path, 'w') as f:
+                json.dump({'EmployeeNumber': watermark, **result}, f)
+            logger.info('watermark %s saved to %s', watermark, watermark_path)
+            if args.publish:
+                # the app only swaps models on a registry promotion, not when the fallback file changes
+                version = registry.publish_version(args.publish, args.output, list(ingest3.columns))
+                registry.promote(args.publish, version)
+            else:
+                logger.warning('Refreshed model not published; restart the app or publish it to serve it')
+
+    elif sp_used == 'publish':
+        if os.path.splitext(args.input[1])[1] == '.npy':
+            feature_columns = model.load_feature_columns(args.input[1])
+        else:
+            feature_columns = list(pd.read_csv(args.input[1], nrows=0).columns)
+        version = registry.publish_version(args.output, args.input[0], feature_columns, args.input[2:])
+        logger.info('model version %s published to %s', version, args.output)
+        if args.promote:
+            registry.promote(args.output, version)
+
+    elif sp_used == 'promote':
+        version = args.version
+        if version is None:
+            versions = registry.list_versions(args.output)
+            current = registry.current_version(args.output)
+            if current not in versions or versions.index(current) == 0:
+                raise SystemExit('No earlier model version to roll back to')
+            version = versions[versions.index(current) - 1]
+        registry.promote(args.output, version)
+        logger.info('model version %s is now served from %s', version, args.output)
@@ -5,7 +5,7 @@ import argparse
 import yaml
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.exc import ProgrammingError, OperationalError
-from src.employee_db import create_db, EmployeeManager
+from src.employee_db import create_db, create_indexes, ingest_files
 
 # define engine string
 engine_string = os.getenv("SQLALCHEMY_DATABASE_URI")
@@ -34,12 +34,24 @@ if __name__ == "__main__":
     sp_create.add_argument("--engine_string", default=engine_string,
                            help="SQLAlchemy connection URI for database")
 
+    # Sub-parser for adding the missing columns and secondary indexes to an existing table
+    sp_index = subparsers.add_parser("create_indexes",
+                                     description="Add missing columns and secondary indexes to the employee table")
+    sp_index.add_argument("--engine_string", default=engine_string,
+                          help="SQLAlchemy connection URI for database")
+
     # Sub-parser for ingesting new data
     sp_ingest = subparsers.add_parser("ingest", description="Add result data to database")
     sp_ingest.add_argument("--input_path", default=config['rds'],
-                           help="input file path")
+                           help="input file, directory of csv files or glob pattern (quoted)")
     sp_ingest.add_argument("--engine_string", default=engine_string,
                            help="SQLAlchemy connection URI for database")
+    sp_ingest.add_argument("--n_workers", type=int, default=config['ingest']['n_workers'],
+                           help="number of files loaded in parallel")
+    sp_ingest.add_argument("--chunk_size", type=int, default=config['ingest']['chunk_size'],
+                           help="rows inserted per statement")
+    sp_ingest.add_argument("--manifest", default=config['ingest']['manifest_path'],
+                           help="json file of finished files, skipped when the ingest is rerun")
 
     args = parser.parse_args()
     sp_used = args.subparser_name
@@ -53,8 +65,17 @@ if __name__ == "__main__":
         except (ProgrammingError, OperationalError) as e:
             logger.error("Exiting. An error has occurred while making the database connection.")
 
+    elif sp_used == 'create_indexes':
+        try:
+            create_indexes(args.engine_string)
+            logger.info("The employee table columns and indexes are up to date")
+        except (ProgrammingError, OperationalError) as e:
+            logger.error("Exiting. An error has occurred while making the database connection.")
+
     elif sp_used == 'ingest':
-        employee = EmployeeManager(engine_string=args.engine_string)
-        employee.add_result(args.input_path)
-        logger.info("the result data has been ingested")
-        employee.close()
+        summary = ingest_files(args.engine_string, args.input_path, n_workers=args.n_workers,
+                               chunk_size=args.chunk_size, manifest_path=args.manifest)
+        if summary['failed']:
+            logger.error("Rerun to retry the files that failed: %s", ', '.join(summary['failed']))
+        else:
+            logger.info("the result data has been ingested")
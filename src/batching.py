@@ -0,0 +1,167 @@
+"""Micro-batching of concurrent single-row predictions into one model call"""
+import collections
+import logging
+import queue
+import threading
+import time
+import typing
+from concurrent.futures import Future
+
+import numpy as np
+
+from src.predict import forest_proba
+
+logger = logging.getLogger(__name__)
+
+
+class BatchingMetrics:
+    """
+    Thread-safe statistics of the batches scored by a `MicroBatcher`.
+    Args:
+        window (int): number of most recent queue waits kept
+    """
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._waits = collections.deque(maxlen=window)
+        self._sizes = collections.Counter()
+        self._rows = 0
+        self._batches = 0
+        self._model_seconds = 0.0
+
+    def record_batch(self, waits: typing.List[float], seconds: float) -> None:
+        """Record one scored batch: the queue wait of each of its rows and the time spent in the model."""
+        with self._lock:
+            self._waits.extend(waits)
+            self._sizes[len(waits)] += 1
+            self._rows += len(waits)
+            self._batches += 1
+            self._model_seconds += seconds
+
+    def snapshot(self) -> dict:
+        """
+        Summarise the batches scored so far
+        Returns:
+            summary (dict): rows, batches and their size distribution, p50/p99 queue wait, and model time per row;
+                `rows_per_call` is the number of model calls each batch replaced
+        """
+        with self._lock:
+            waits_ms = np.array(self._waits) * 1000
+            return {'rows': self._rows,
+                    'batches': self._batches,
+                    'rows_per_call': self._rows / self._batches if self._batches else None,
+                    'batch_sizes': {str(size): count for size, count in sorted(self._sizes.items())},
+                    'queue_wait_p50_ms': float(np.percentile(waits_ms, 50)) if len(waits_ms) else None,
+                    'queue_wait_p99_ms': float(np.percentile(waits_ms, 99)) if len(waits_ms) else None,
+                    'model_ms_per_row': self._model_seconds * 1000 / self._rows if self._rows else None}
+
+
+class MicroBatcher:
+    """
+    Collects the rows of concurrent requests and scores them together. A worker thread takes the first
+    queued row, waits up to `max_wait_ms` for more (or until `max_batch_size` rows are in), and scores the
+    rows of each model in one call; each caller gets its own probabilities back. Forest inference on a few
+    dozen rows costs little more than on one, so under concurrent load the model is called far less often.
+    Args:
+        max_batch_size (int): most rows scored in one call
+        max_wait_ms (float): longest a row waits for others before its batch is scored
+        metrics (:obj:`BatchingMetrics`): collected statistics
+    """
+
+    def __init__(self, max_batch_size: int = 32, max_wait_ms: float = 2.0,
+                 metrics: typing.Optional[BatchingMetrics] = None):
+        if max_batch_size < 1:
+            raise ValueError("`max_batch_size` must be at least 1")
+        if max_wait_ms < 0:
+            raise ValueError("`max_wait_ms` must not be negative")
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = metrics or BatchingMetrics()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._closed_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._worker.start()
+
+    def predict_proba(self, model, row: np.ndarray) -> np.ndarray:
+        """
+        Score one encoded row within the next batch, blocking until it is scored
+        Args:
+            model (sklearn.RandomForestClassifier): model to score the row with
+            row (np.ndarray): float32 row of shape (1, number of training columns)
+        Returns:
+            proba (np.ndarray): probability of each class of `model.classes_`
+        Raises:
+            RuntimeError: if the batcher has been shut down
+        """
+        future = Future()
+        with self._closed_lock:
+            if self._closed:
+                raise RuntimeError("The micro-batcher has been shut down")
+            self._queue.put((model, row, time.perf_counter(), future))
+        return future.result()
+
+    def _run(self) -> None:
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is None:
+                    return
+                batch = [item]
+                deadline = item[2] + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._score(batch)
+        finally:
+            # no caller may wait forever on a row the worker will never score
+            self._fail_pending()
+
+    def _fail_pending(self) -> None:
+        """Stop accepting rows and fail those still queued."""
+        with self._closed_lock:
+            self._closed = True
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                item[3].set_exception(RuntimeError("The micro-batcher stopped before scoring the row"))
+
+    def _score(self, batch: typing.List[tuple]) -> None:
+        """Score the rows of a batch, one model call per model version in it."""
+        start = time.perf_counter()
+        groups = collections.defaultdict(list)
+        for item in batch:
+            groups[id(item[0])].append(item)
+
+        for items in groups.values():
+            try:
+                proba = forest_proba(items[0][0], np.vstack([row for _, row, _, _ in items]))
+            except Exception as e:
+                logger.warning('Scoring a batch of %s rows failed', len(items), exc_info=True)
+                for _, _, _, future in items:
+                    future.set_exception(e)
+                continue
+            for (_, _, _, future), row_proba in zip(items, proba):
+                future.set_result(row_proba)
+        self.metrics.record_batch([start - enqueued for _, _, enqueued, _ in batch], time.perf_counter() - start)
+
+    def shutdown(self) -> None:
+        """
+        Score the rows already queued and stop the worker; later calls of `predict_proba` raise RuntimeError
+        Returns: None
+        """
+        with self._closed_lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(None)
+        self._worker.join()
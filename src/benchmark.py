@@ -0,0 +1,310 @@
+"""Benchmark suite for the preprocessing, training, inference and ingest stages"""
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+import typing
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.employee_db import EmployeeManager, create_db, ingest_files
+from src.model import clean_data, split_data, train_model, predict
+from src.predict import EmployeeRecord, predict_row, prediction, row_encoder, transform_input
+
+logger = logging.getLogger(__name__)
+
+# value ranges observed in data/raw/employee_attrition_train.csv
+ORDINAL_RANGES = {'EnvironmentSatisfaction': (1, 4),
+                  'JobInvolvement': (1, 4),
+                  'JobLevel': (1, 5),
+                  'JobSatisfaction': (1, 4),
+                  'PerformanceRating': (3, 4),
+                  'RelationshipSatisfaction': (1, 4),
+                  'WorkLifeBalance': (1, 4),
+                  'YearsSinceLastPromotion': (0, 15)}
+CATEGORICAL_LEVELS = {'Gender': ['Female', 'Male'],
+                      'MaritalStatus': ['Divorced', 'Married', 'Single'],
+                      'OverTime': ['No', 'Yes'],
+                      'Attrition': ['No', 'Yes']}
+NUMERIC_RANGES = {'Age': (18, 60),
+                  'DailyRate': (102, 1499),
+                  'DistanceFromHome': (1, 29)}
+
+
+def make_synthetic_employees(n_rows: int, random_state: int = 101, missing_rate: float = 0.0) -> pd.DataFrame:
+    """Generate synthetic employee records shaped like the raw training data
+    Args:
+        n_rows (int): number of employees to generate
+        random_state (int): random state
+        missing_rate (float): share of rows with a missing value in each of the numeric columns
+    Returns:
+        data (pd.DataFrame): synthetic raw employee data
+    """
+    if n_rows <= 0:
+        raise ValueError("`n_rows` must be positive")
+
+    rng = np.random.default_rng(random_state)
+    data = {'EmployeeNumber': np.arange(1, n_rows + 1)}
+    for col, (low, high) in ORDINAL_RANGES.items():
+        data[col] = rng.integers(low, high + 1, size=n_rows)
+    for col, levels in CATEGORICAL_LEVELS.items():
+        data[col] = np.array(levels, dtype=object)[rng.integers(0, len(levels), size=n_rows)]
+    for col, (low, high) in NUMERIC_RANGES.items():
+        values = rng.integers(low, high + 1, size=n_rows).astype(float)
+        if missing_rate > 0:
+            values[rng.random(n_rows) < missing_rate] = np.nan
+        data[col] = values
+
+    logger.debug('Generated %s synthetic employee records', n_rows)
+    return pd.DataFrame(data)
+
+
+def time_call(func: typing.Callable, *args, repeat: int = 1, **kwargs) -> typing.List[float]:
+    """Time repeated calls of a function
+    Args:
+        func (callable): function to be timed
+        repeat (int): number of calls
+        *args, **kwargs: arguments passed to the function
+    Returns:
+        timings (list(float)): wall clock seconds of each call
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def latency_summary(timings: typing.List[float]) -> dict:
+    """Summarise call latencies into percentiles
+    Args:
+        timings (list(float)): wall clock seconds of each call
+    Returns:
+        summary (dict): p50, p95 and p99 latency in milliseconds plus the number of calls
+    """
+    timings_ms = np.asarray(timings) * 1000
+    return {'p50_ms': float(np.percentile(timings_ms, 50)),
+            'p95_ms': float(np.percentile(timings_ms, 95)),
+            'p99_ms': float(np.percentile(timings_ms, 99)),
+            'calls': len(timings)}
+
+
+def peak_allocation(func: typing.Callable, *args, repeat: int = 10, **kwargs) -> float:
+    """Measure the memory a function allocates at its peak, with tracemalloc
+    Args:
+        func (callable): function to be measured
+        repeat (int): number of calls
+        *args, **kwargs: arguments passed to the function
+    Returns:
+        peak_kb (float): median over the calls of the peak kilobytes allocated during the call
+    """
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(repeat):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            func(*args, **kwargs)
+            peaks.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+    finally:
+        tracemalloc.stop()
+    return float(np.median(peaks))
+
+
+def benchmark_score_one(final_rf, feature_columns: typing.List[str], form: dict, calls: int = 100) -> dict:
+    """Compare scoring one app input through pandas with the record path the app uses
+    Args:
+        final_rf (sklearn.RandomForestClassifier): trained random forest model
+        feature_columns (list(str)): columns of the training data, in order
+        form (dict): submitted form fields, as strings
+        calls (int): number of timed calls of each path
+    Returns:
+        result (dict): latency and peak allocation of each path, keyed by stage name
+    """
+    columns = ['EmployeeNumber'] + list(feature_columns)
+
+    def pandas_path():
+        user_input = dict({name: int(form[name]) for name in ORDINAL_RANGES}, EmployeeNumber=1,
+                          MaritalStatus=form['MaritalStatus'], Gender=form['Gender'], OverTime=form['OverTime'])
+        # single-row inputs only carry the dummy columns that are switched on
+        return prediction(transform_input(user_input).reindex(columns=columns, fill_value=0), loaded_rf=final_rf)
+
+    def record_path():
+        record = EmployeeRecord.from_form(form)
+        return predict_row(final_rf, row_encoder(tuple(feature_columns)).encode(record))
+
+    result = {}
+    for stage, func in [('score_one_pandas', pandas_path), ('score_one_record', record_path)]:
+        func()
+        result[stage] = latency_summary(time_call(func, repeat=calls))
+        result[stage]['peak_kb'] = peak_allocation(func)
+        logger.info('%s p50 %.2fms, peak allocation %.1fkB', stage, result[stage]['p50_ms'],
+                    result[stage]['peak_kb'])
+    return result
+
+
+def benchmark_size(n_rows: int, clean_config: dict, split_config: dict, train_config: dict,
+                   random_state: int = 101, missing_rate: float = 0.0, latency_calls: int = 100,
+                   max_rows: typing.Optional[dict] = None, work_dir: typing.Optional[str] = None,
+                   ingest_config: typing.Optional[dict] = None) -> dict:
+    """Benchmark every stage of the pipeline on one synthetic data size
+    Args:
+        n_rows (int): number of synthetic employees
+        clean_config (dict): keyword arguments of `clean_data` (config.yaml)
+        split_config (dict): keyword arguments of `split_data` (config.yaml)
+        train_config (dict): keyword arguments of `train_model` (config.yaml)
+        random_state (int): random state of the synthetic data
+        missing_rate (float): share of missing values in the numeric columns
+        latency_calls (int): number of single-row `prediction` calls
+        max_rows (dict): largest size at which each stage is still run; stages without an entry always run
+        work_dir (str): directory for the generated model, csv and SQLite files; a temporary directory,
+            deleted afterwards, if None
+        ingest_config (dict): `n_workers` and `chunk_size` of `ingest_files` (config.yaml)
+    Returns:
+        result (dict): timings of each stage, keyed by stage name
+    """
+    if work_dir is None:
+        with tempfile.TemporaryDirectory(prefix='benchmark_') as tmp_dir:
+            return benchmark_size(n_rows, clean_config, split_config, train_config, random_state=random_state,
+                                  missing_rate=missing_rate, latency_calls=latency_calls, max_rows=max_rows,
+                                  work_dir=tmp_dir, ingest_config=ingest_config)
+    max_rows = max_rows or {}
+    ingest_config = ingest_config or {}
+
+    def runs(stage: str) -> bool:
+        limit = max_rows.get(stage)
+        if limit is not None and n_rows > limit:
+            logger.info('Skipping %s at %s rows (limit %s)', stage, n_rows, limit)
+            return False
+        return True
+
+    result = {}
+    raw = make_synthetic_employees(n_rows, random_state=random_state, missing_rate=missing_rate)
+
+    clean_kwargs = dict(clean_config, output_path='')
+    start = time.perf_counter()
+    df_model = clean_data(raw.copy(), **clean_kwargs)
+    result['clean_data'] = {'seconds': time.perf_counter() - start}
+    logger.info('clean_data on %s rows: %.3fs', n_rows, result['clean_data']['seconds'])
+
+    start = time.perf_counter()
+    X_train, X_test, y_train, _ = split_data(df_model, **split_config)
+    result['split_data'] = {'seconds': time.perf_counter() - start}
+    logger.info('split_data on %s rows: %.3fs', n_rows, result['split_data']['seconds'])
+
+    if runs('train_model'):
+        start = time.perf_counter()
+        final_rf = train_model(X_train, y_train, **train_config)
+        result['train_model'] = {'seconds': time.perf_counter() - start}
+        logger.info('train_model on %s rows: %.3fs', n_rows, result['train_model']['seconds'])
+
+        model_path = os.path.join(work_dir, 'rf_%s.joblib' % n_rows)
+        joblib.dump(final_rf, model_path)
+
+        if runs('prediction'):
+            user_input = raw.iloc[0][['EmployeeNumber'] + list(ORDINAL_RANGES) +
+                                     ['MaritalStatus', 'Gender', 'OverTime']].to_dict()
+            input_df = transform_input(user_input)
+            # single-row inputs only carry the dummy columns that are switched on
+            input_df = input_df.reindex(columns=['EmployeeNumber'] + list(X_train.columns), fill_value=0)
+            timings = time_call(prediction, input_df, model_path=model_path, repeat=latency_calls)
+            result['prediction'] = latency_summary(timings)
+            logger.info('prediction p50 %.2fms, p99 %.2fms', result['prediction']['p50_ms'],
+                        result['prediction']['p99_ms'])
+
+        if runs('score_one'):
+            form = {name: str(value) for name, value in
+                    raw.iloc[0][list(ORDINAL_RANGES) + ['MaritalStatus', 'Gender', 'OverTime']].items()}
+            result.update(benchmark_score_one(final_rf, list(X_train.columns), form, calls=latency_calls))
+
+        if runs('batch_predict'):
+            seconds = time_call(predict, final_rf, X_test)[0]
+            result['batch_predict'] = {'seconds': seconds, 'rows_per_sec': len(X_test) / seconds}
+            logger.info('batch predict: %.0f rows/s', result['batch_predict']['rows_per_sec'])
+
+    results = raw[['EmployeeNumber'] + list(ORDINAL_RANGES) + list(CATEGORICAL_LEVELS)]
+
+    def empty_db(stage: str) -> str:
+        db_path = os.path.join(work_dir, '%s_%s.db' % (stage, n_rows))
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        engine_string = 'sqlite:///%s' % db_path
+        create_db(engine_string)
+        return engine_string
+
+    if runs('add_result'):
+        results_path = os.path.join(work_dir, 'employee_results_%s.csv' % n_rows)
+        results.to_csv(results_path, index=False)
+        employee_manager = EmployeeManager(engine_string=empty_db('add_result'))
+        seconds = time_call(employee_manager.add_result, results_path)[0]
+        employee_manager.close()
+        result['add_result'] = {'seconds': seconds, 'rows_per_sec': n_rows / seconds}
+        logger.info('add_result: %.0f rows/s', result['add_result']['rows_per_sec'])
+
+    if runs('ingest_files'):
+        # one file per worker, as a backfill of several result files would be loaded
+        n_workers = ingest_config.get('n_workers', 4)
+        input_dir = os.path.join(work_dir, 'employee_results_%s' % n_rows)
+        os.makedirs(input_dir, exist_ok=True)
+        for i, part in enumerate(np.array_split(np.arange(n_rows), n_workers)):
+            results.iloc[part].to_csv(os.path.join(input_dir, 'part_%s.csv' % i), index=False)
+        summary = ingest_files(empty_db('ingest_files'), input_dir, n_workers=n_workers,
+                               chunk_size=ingest_config.get('chunk_size', 1000))
+        result['ingest_files'] = {'seconds': summary['seconds'], 'rows_per_sec': summary['rows_per_sec']}
+        logger.info('ingest_files: %.0f rows/s', result['ingest_files']['rows_per_sec'])
+
+    return result
+
+
+def run_benchmarks(sizes: typing.List[int], clean_config: dict, split_config: dict, train_config: dict,
+                   **kwargs) -> dict:
+    """Benchmark the pipeline across several synthetic data sizes
+    Args:
+        sizes (list(int)): numbers of synthetic employees
+        clean_config (dict): keyword arguments of `clean_data` (config.yaml)
+        split_config (dict): keyword arguments of `split_data` (config.yaml)
+        train_config (dict): keyword arguments of `train_model` (config.yaml)
+        **kwargs: further arguments of `benchmark_size`
+    Returns:
+        results (dict): flat mapping of `<rows>/<stage>/<metric>` to its measured value
+    """
+    results = {}
+    for n_rows in sizes:
+        logger.info('Benchmarking %s rows', n_rows)
+        size_result = benchmark_size(n_rows, clean_config, split_config, train_config, **kwargs)
+        for stage, metrics in size_result.items():
+            for metric, value in metrics.items():
+                results['%s/%s/%s' % (n_rows, stage, metric)] = value
+    return results
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> typing.List[str]:
+    """Compare benchmark results with a stored baseline
+    Metrics ending in `_per_sec` regress when they drop, timings regress when they grow, and
+    call counts are ignored.
+    Args:
+        results (dict): flat benchmark results from `run_benchmarks`
+        baseline (dict): flat benchmark results of the baseline
+        tolerance (float): allowed relative change before a metric counts as a regression
+    Returns:
+        regressions (list(str)): description of every metric outside the tolerance
+    """
+    if tolerance < 0:
+        raise ValueError("`tolerance` must not be negative")
+
+    regressions = []
+    for key, value in results.items():
+        if key not in baseline or key.endswith('/calls'):
+            continue
+        base = baseline[key]
+        if key.endswith('_per_sec'):
+            regressed = value < base * (1 - tolerance)
+        else:
+            regressed = value > base * (1 + tolerance)
+        if regressed:
+            regressions.append('%s: %.4g (baseline %.4g)' % (key, value, base))
+    return regressions
@@ -0,0 +1,136 @@
+"""Drift of live app inputs against the training distribution, from fixed-size histograms"""
+import json
+import logging
+import threading
+import typing
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+OTHER = '__other__'  # bucket of categorical levels not seen in training
+
+
+def build_profile(data: pd.DataFrame, ordinal_columns: typing.List[str],
+                  categorical_columns: typing.List[str]) -> dict:
+    """Histogram every monitored feature of the training data
+    Ordinal features get one bin per integer between their training minimum and maximum, categorical
+    features one bin per training level plus one for unseen levels, so live histograms have a fixed size.
+    Args:
+        data (pd.DataFrame): raw training data
+        ordinal_columns (list(str)): integer-valued features
+        categorical_columns (list(str)): string-valued features
+    Returns:
+        profile (dict): bin values and training counts per feature
+    """
+    features = {}
+    for col in ordinal_columns:
+        values = data[col].dropna().astype(int)
+        bins = list(range(int(values.min()), int(values.max()) + 1))
+        counts = values.value_counts().reindex(bins, fill_value=0)
+        features[col] = {'kind': 'ordinal', 'bins': bins, 'counts': counts.tolist()}
+    for col in categorical_columns:
+        counts = data[col].dropna().astype(str).value_counts().sort_index()
+        features[col] = {'kind': 'categorical', 'bins': counts.index.tolist() + [OTHER],
+                         'counts': counts.tolist() + [0]}
+    logger.info('Reference profile built for %s features from %s rows', len(features), len(data))
+    return {'features': features}
+
+
+def psi(expected: np.ndarray, actual: np.ndarray, epsilon: float = 1e-4) -> float:
+    """Population stability index between two histograms over the same bins
+    Args:
+        expected (np.ndarray): counts of the reference data
+        actual (np.ndarray): counts of the live data
+        epsilon (float): share given to empty bins so the index stays finite
+    Returns:
+        index (float): 0 for identical distributions; above 0.2 is commonly read as a material shift
+    """
+    expected = np.maximum(expected / expected.sum(), epsilon)
+    actual = np.maximum(actual / actual.sum(), epsilon)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks_statistic(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Largest gap between the cumulative distributions of two histograms over the same ordered bins."""
+    return float(np.max(np.abs(np.cumsum(expected) / expected.sum() - np.cumsum(actual) / actual.sum())))
+
+
+class DriftMonitor:
+    """
+    Keeps one fixed-size histogram per monitored feature of the live inputs, updated on every prediction,
+    and compares it with the training profile on demand. An update is a dictionary lookup and an integer
+    increment per feature, so memory is constant and the request path is not slowed down.
+    Args:
+        profile (dict): output of `build_profile`
+        psi_threshold (float): PSI above which a feature is flagged as drifted
+    """
+
+    def __init__(self, profile: dict, psi_threshold: float = 0.2):
+        self.psi_threshold = psi_threshold
+        self._reference = {}
+        self._index = {}
+        self._live = {}
+        self._kind = {}
+        self._low = {}
+        for col, feature in profile['features'].items():
+            self._reference[col] = np.asarray(feature['counts'], dtype=np.float64)
+            self._index[col] = {value: i for i, value in enumerate(feature['bins'])}
+            # plain lists, as incrementing one element of a NumPy array costs several times more
+            self._live[col] = [0] * len(feature['bins'])
+            self._kind[col] = feature['kind']
+            self._low[col] = feature['bins'][0]
+        self._lock = threading.Lock()
+        self.observations = 0
+
+    @classmethod
+    def from_file(cls, path: str, psi_threshold: float = 0.2) -> 'DriftMonitor':
+        """Create a monitor from a profile saved as json."""
+        with open(path, 'r') as f:
+            return cls(json.load(f), psi_threshold=psi_threshold)
+
+    def _bin(self, col: str, value) -> int:
+        i = self._index[col].get(value)
+        if i is not None:
+            return i
+        if self._kind[col] == 'ordinal':
+            # values outside the training range fall in the outermost bins
+            return min(max(int(value) - self._low[col], 0), len(self._index[col]) - 1)
+        return self._index[col].get(str(value), self._index[col][OTHER])
+
+    def update(self, record: dict) -> None:
+        """
+        Add one app input to the live histograms
+        Args:
+            record (dict): input with the monitored features; missing features are skipped
+        Returns: None
+        """
+        bins = [(col, self._bin(col, record[col])) for col in self._live if record.get(col) is not None]
+        with self._lock:
+            for col, i in bins:
+                self._live[col][i] += 1
+            self.observations += 1
+
+    def report(self) -> dict:
+        """
+        Compare the live histograms with the training profile
+        Returns:
+            report (dict): number of inputs seen, PSI per feature (and KS for ordinal features),
+                and the features whose PSI exceeds the threshold
+        """
+        with self._lock:
+            live = {col: np.array(counts) for col, counts in self._live.items()}
+            observations = self.observations
+
+        features = {}
+        for col, counts in live.items():
+            if counts.sum() == 0:
+                continue
+            features[col] = {'psi': psi(self._reference[col], counts)}
+            if self._kind[col] == 'ordinal':
+                features[col]['ks'] = ks_statistic(self._reference[col], counts)
+        return {'observations': observations,
+                'psi_threshold': self.psi_threshold,
+                'drifted': sorted(col for col, stats in features.items() if stats['psi'] > self.psi_threshold),
+                'features': features}
@@ -1,5 +1,12 @@
+import collections
+import glob
+import json
+import os
+import threading
+import time
 import typing
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import flask
 import pandas as pd
@@ -22,6 +29,10 @@ class Employee(Base):
     """Creates a data model for the database to be set up for employees."""
 
     __tablename__ = "Employee"
+    # (filter column, primary key) indexes serve filtered, keyset-paginated reads without table scans
+    __table_args__ = (sqlalchemy.Index('ix_Employee_Attrition', 'Attrition', 'EmployeeNumber'),
+                      sqlalchemy.Index('ix_Employee_OverTime', 'OverTime', 'EmployeeNumber'),
+                      sqlalchemy.Index('ix_Employee_JobLevel', 'JobLevel', 'EmployeeNumber'))
 
     EmployeeNumber = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
 
@@ -38,6 +49,7 @@ class Employee(Base):
     Gender = sqlalchemy.Column(sqlalchemy.String(100), unique=False, nullable=True)
     OverTime = sqlalchemy.Column(sqlalchemy.String(100), unique=False, nullable=True)
     Attrition = sqlalchemy.Column(sqlalchemy.String(100), unique=False, nullable=True)
+    ModelVersion = sqlalchemy.Column(sqlalchemy.String(100), unique=False, nullable=True)
 
     def __repr__(self):
         return '<Employee %d>' % self.EmployeeNumber
@@ -73,6 +85,165 @@ def create_db(engine_string: str = None) -> None:
         logger.error('%s', message)
 
 
+# Columns the read-side queries can filter and group on
+FILTER_COLUMNS = ['Attrition', 'OverTime', 'JobLevel', 'Gender', 'MaritalStatus', 'ModelVersion']
+
+
+def add_missing_columns(engine: sqlalchemy.engine.Engine) -> typing.List[str]:
+    """
+    Add the nullable columns of the Employee table missing from a table created before they existed
+    Args:
+        engine (sqlalchemy.engine.Engine): engine of the database holding the table
+    Returns:
+        added (list(str)): names of the columns added
+    """
+    existing = {column['name'] for column in sqlalchemy.inspect(engine).get_columns(Employee.__tablename__)}
+    quote = engine.dialect.identifier_preparer.quote
+    added = []
+    with engine.begin() as conn:
+        for column in Employee.__table__.columns:
+            if column.name in existing:
+                continue
+            conn.execute(sqlalchemy.text('ALTER TABLE %s ADD COLUMN %s %s' % (
+                quote(Employee.__tablename__), quote(column.name), column.type.compile(dialect=engine.dialect))))
+            logger.info("Column %s added to the %s table", column.name, Employee.__tablename__)
+            added.append(column.name)
+    return added
+
+
+def create_indexes(engine_string: str) -> None:
+    """
+    Bring the Employee table of a database created by an earlier version up to date: add the columns and
+    then the secondary indexes it is missing
+    Args:
+        engine_string (str): SQLAlchemy engine string specifying which database to write to
+    Returns: None
+    """
+    engine = sqlalchemy.create_engine(engine_string)
+    add_missing_columns(engine)
+    existing = {index['name'] for index in sqlalchemy.inspect(engine).get_indexes(Employee.__tablename__)}
+    for index in Employee.__table__.indexes:
+        if index.name not in existing:
+            index.create(engine)
+        logger.info("Index %s is in place", index.name)
+    engine.dispose()
+
+
+def find_input_files(input_path: str) -> typing.List[str]:
+    """
+    List the result files to ingest
+    Args:
+        input_path (str): a csv file, a directory of csv files or a glob pattern, e.g. 'data/results/2022-*.csv'
+    Returns:
+        paths (list(str)): matching files, sorted
+    """
+    if os.path.isdir(input_path):
+        input_path = os.path.join(input_path, '*.csv')
+    paths = sorted(path for path in glob.glob(input_path) if os.path.isfile(path))
+    if not paths:
+        raise FileNotFoundError("No result files match %s" % input_path)
+    return paths
+
+
+def _load_file(engine: sqlalchemy.engine.Engine, path: str, chunk_size: int,
+               progress: typing.Callable[[int], None]) -> int:
+    """Insert one result file in chunks of `chunk_size` rows, within a single transaction."""
+    columns = [column.name for column in Employee.__table__.columns]
+    insert = Employee.__table__.insert()
+    rows = 0
+    with engine.begin() as connection:
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            chunk = chunk[[col for col in columns if col in chunk.columns]]
+            # missing values, e.g. the Attrition of employees scored by the app, are stored as NULL
+            records = chunk.astype(object).where(chunk.notna(), None).to_dict(orient='records')
+            connection.execute(insert, records)
+            rows += len(records)
+            progress(len(records))
+    return rows
+
+
+def ingest_files(engine_string: str, input_path: str, n_workers: int = 4, chunk_size: int = 1000,
+                 manifest_path: typing.Optional[str] = None) -> dict:
+    """
+    Load many result files into the Employee table in parallel
+    Each worker takes one file at a time on its own pooled connection and inserts it in chunks of bulk
+    `executemany` statements within one transaction, so a file is either fully loaded or not at all.
+    Finished files are recorded in the manifest, and files already in it are skipped, so an interrupted
+    backfill can be rerun as is. SQLite serializes writers; the parallelism pays off on MySQL.
+    Args:
+        engine_string (str): SQLAlchemy engine string specifying which database to write to
+        input_path (str): a csv file, a directory of csv files or a glob pattern
+        n_workers (int): number of files loaded at once, and of pooled connections
+        chunk_size (int): rows read and inserted per statement
+        manifest_path (str): json file recording finished files; no resuming if None
+    Returns:
+        summary (dict): files loaded, skipped and failed, rows inserted and rows per second
+    """
+    paths = find_input_files(input_path)
+    finished = {}
+    if manifest_path is not None and os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            finished = json.load(f)['finished']
+    pending = [path for path in paths if os.path.abspath(path) not in finished]
+    logger.info("%s result files found, %s already ingested", len(paths), len(paths) - len(pending))
+
+    connect_args = {}
+    if engine_string.startswith('sqlite'):
+        # pooled SQLite connections move between threads, and writers wait for the one holding the lock
+        connect_args = {'check_same_thread': False, 'timeout': 600}
+    engine = sqlalchemy.create_engine(engine_string, poolclass=sqlalchemy.pool.QueuePool, pool_size=n_workers,
+                                      max_overflow=0, connect_args=connect_args)
+    lock = threading.Lock()
+    start = time.perf_counter()
+    totals = {'rows': 0, 'files': 0}
+    failed = []
+
+    def progress(rows: int) -> None:
+        with lock:
+            totals['rows'] += rows
+            logger.debug("%s rows ingested, %.0f rows/s", totals['rows'],
+                         totals['rows'] / (time.perf_counter() - start))
+
+    def load(path: str) -> None:
+        inserted = [0]
+
+        def file_progress(rows: int) -> None:
+            inserted[0] += rows
+            progress(rows)
+
+        try:
+            rows = _load_file(engine, path, chunk_size, file_progress)
+        except (sqlalchemy.exc.SQLAlchemyError, OSError, ValueError, pd.errors.ParserError):
+            logger.error("Could not ingest %s, rolled back", path, exc_info=True)
+            with lock:
+                totals['rows'] -= inserted[0]
+                failed.append(path)
+            return
+
+        with lock:
+            totals['files'] += 1
+            finished[os.path.abspath(path)] = rows
+            if manifest_path is not None:
+                # write next to the manifest and rename so an interruption never leaves it half-written
+                with open(manifest_path + '.tmp', 'w') as f:
+                    json.dump({'finished': finished}, f, indent=2)
+                os.replace(manifest_path + '.tmp', manifest_path)
+            logger.info("%s: %s rows ingested (%s/%s files, %.0f rows/s overall)", path, rows,
+                        totals['files'], len(pending), totals['rows'] / (time.perf_counter() - start))
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        list(executor.map(load, pending))
+    engine.dispose()
+
+    seconds = time.perf_counter() - start
+    summary = {'files': totals['files'], 'skipped': len(paths) - len(pending), 'failed': failed,
+               'rows': totals['rows'], 'seconds': seconds,
+               'rows_per_sec': totals['rows'] / seconds if seconds > 0 else None}
+    logger.info("%s rows from %s files ingested in %.1fs (%.0f rows/s), %s failed", summary['rows'],
+                summary['files'], seconds, summary['rows_per_sec'] or 0, len(failed))
+    return summary
+
+
 class EmployeeManager:
     """
     Creates a SQLAlchemy connection to the Employee table.
@@ -99,6 +270,10 @@ class EmployeeManager:
             self.session = session_maker()
         else:
             raise ValueError("Need either an engine string or a Flask app to initialize")
+        self.count_ttl = 30.0
+        self.count_cache_size = 256
+        self._count_cache = collections.OrderedDict()
+        self._count_lock = threading.Lock()
 
     def add_result(self, input_path: str) -> None:
         """
@@ -141,10 +316,12 @@ class EmployeeManager:
                      MaritalStatus: str,
                      Gender: str,
                      OverTime: str,
-                     Attrition: str) -> None:
+                     Attrition: str,
+                     ModelVersion: typing.Optional[str] = None) -> None:
         """Seeds an existing database with a new employee.
         Args:
             arguments with respect to employee (self-explanatory by names)
+            ModelVersion (str): version of the model that predicted `Attrition`
         Returns:
             None
         """
@@ -157,11 +334,82 @@ class EmployeeManager:
                             JobInvolvement=JobInvolvement, JobLevel=JobLevel, JobSatisfaction=JobSatisfaction,
                             PerformanceRating=PerformanceRating, RelationshipSatisfaction=RelationshipSatisfaction,
                             YearsSinceLastPromotion=YearsSinceLastPromotion, WorkLifeBalance=WorkLifeBalance,
-                            MaritalStatus=MaritalStatus, Gender=Gender, OverTime=OverTime, Attrition=Attrition)
+                            MaritalStatus=MaritalStatus, Gender=Gender, OverTime=OverTime, Attrition=Attrition,
+                            ModelVersion=ModelVersion)
         session.add(employee)
-        session.commit()
+        try:
+            session.commit()
+        except sqlalchemy.exc.SQLAlchemyError:
+            # leave the session usable for the next request
+            session.rollback()
+            raise
         logger.info("new employee added")
 
+    def query_employees(self, filters: typing.Optional[dict] = None, after: typing.Optional[int] = None,
+                        limit: int = 100) -> typing.Tuple[typing.List[dict], typing.Optional[int]]:
+        """
+        List scored employees page by page in EmployeeNumber order
+        Args:
+            filters (dict): column values to match, keys from `FILTER_COLUMNS`
+            after (int): EmployeeNumber of the last row of the previous page; first page if None
+            limit (int): rows per page
+        Returns:
+            employees (list(dict)): rows of the page
+            next_after (int): value of `after` for the next page, None on the last page
+        """
+        filters = filters or {}
+        unknown = set(filters) - set(FILTER_COLUMNS)
+        if unknown:
+            raise ValueError("Cannot filter on %s" % ', '.join(sorted(unknown)))
+
+        # keyset pagination: seek past the last key instead of counting skipped rows with OFFSET
+        query = self.session.query(Employee).filter_by(**filters)
+        if after is not None:
+            query = query.filter(Employee.EmployeeNumber > after)
+        rows = query.order_by(Employee.EmployeeNumber).limit(limit + 1).all()
+
+        next_after = rows[limit - 1].EmployeeNumber if len(rows) > limit else None
+        employees = [{column.name: getattr(row, column.name) for column in Employee.__table__.columns}
+                     for row in rows[:limit]]
+        return employees, next_after
+
+    def count_by(self, column: str,
+                 filters: typing.Optional[dict] = None) -> typing.Dict[typing.Optional[str], int]:
+        """
+        Count scored employees per value of a column, reusing counts younger than `count_ttl` seconds.
+        At most `count_cache_size` queries are cached; the least recently used is dropped first.
+        Args:
+            column (str): column to group on, from `FILTER_COLUMNS`
+            filters (dict): column values to match, keys from `FILTER_COLUMNS`
+        Returns:
+            counts (dict): number of employees per value, under None for employees without one
+        """
+        filters = filters or {}
+        unknown = ({column} | set(filters)) - set(FILTER_COLUMNS)
+        if unknown:
+            raise ValueError("Cannot group or filter on %s" % ', '.join(sorted(unknown)))
+
+        key = (column, tuple(sorted(filters.items())))
+        now = time.monotonic()
+        with self._count_lock:
+            cached = self._count_cache.get(key)
+            if cached is not None:
+                self._count_cache.move_to_end(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        group = getattr(Employee, column)
+        rows = self.session.query(group, sqlalchemy.func.count()).filter_by(**filters).group_by(group).all()
+        counts = {str(value) if value is not None else None: count for value, count in rows}
+        with self._count_lock:
+            # the keys come from request parameters: drop expired entries, then the least recently used
+            for stale in [k for k, (expires, _) in self._count_cache.items() if expires <= now]:
+                del self._count_cache[stale]
+            self._count_cache[key] = (now + self.count_ttl, counts)
+            while len(self._count_cache) > self.count_cache_size:
+                self._count_cache.popitem(last=False)
+        return counts
+
     def close(self) -> None:
         """
         Closes SQLAlchemy session
@@ -0,0 +1,207 @@
+"""Threshold sweeps and bootstrap confidence intervals from scored files"""
+import logging
+import os
+import typing
+
+import joblib
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BOOTSTRAP_CHUNK = 50  # bootstrap replicates per parallel task
+DEFAULT_BINS = 10000  # score bins of inputs longer than one chunk when `n_bins` is unset
+
+
+def score_counts(y_true: np.ndarray, scores: np.ndarray, n_bins: typing.Optional[int] = None,
+                 chunk_size: int = 1000000) -> [np.ndarray, np.ndarray, np.ndarray]:
+    """Count positives and negatives at every distinct score
+    With `n_bins` set, probabilities are streamed in chunks into `n_bins` equal-width bins, so memory stays
+    constant for memory-mapped inputs of any length. With `n_bins` unset, inputs of at most `chunk_size` rows
+    are sorted once and every distinct score is a threshold; longer ones are binned into `DEFAULT_BINS` bins.
+    Args:
+        y_true (np.ndarray): 0/1 labels
+        scores (np.ndarray): predicted probabilities, possibly memory-mapped
+        n_bins (int): number of score bins; exact thresholds for short inputs if None
+        chunk_size (int): rows read at a time when binning
+    Returns:
+        thresholds (np.ndarray): distinct scores (or bin edges), in decreasing order
+        pos (np.ndarray): number of positives at each threshold
+        neg (np.ndarray): number of negatives at each threshold
+    """
+    if len(y_true) != len(scores):
+        raise ValueError("`y_true` and `scores` must have the same length")
+
+    if n_bins is None and len(scores) > chunk_size:
+        # exact thresholds would load and sort every score at once
+        n_bins = DEFAULT_BINS
+        logger.info('%s scores are more than one chunk, counted in %s bins', len(scores), n_bins)
+
+    if n_bins is None:
+        thresholds, inverse = np.unique(np.asarray(scores), return_inverse=True)
+        total = np.bincount(inverse, minlength=len(thresholds))
+        pos = np.bincount(inverse, weights=np.asarray(y_true), minlength=len(thresholds)).astype(np.int64)
+    else:
+        total = np.zeros(n_bins + 1, dtype=np.int64)
+        pos = np.zeros(n_bins + 1, dtype=np.int64)
+        for start in range(0, len(scores), chunk_size):
+            # the small offset keeps scores that sit on a bin edge, e.g. 0.29 with 100 bins, in that bin
+            bins = np.clip((np.asarray(scores[start:start + chunk_size]) * n_bins + 1e-9).astype(np.int64),
+                           0, n_bins)
+            labels = np.asarray(y_true[start:start + chunk_size])
+            total += np.bincount(bins, minlength=n_bins + 1)
+            pos += np.bincount(bins, weights=labels, minlength=n_bins + 1).astype(np.int64)
+        thresholds = np.arange(n_bins + 1) / n_bins
+
+    return thresholds[::-1], pos[::-1], (total - pos)[::-1]
+
+
+def threshold_table(thresholds: np.ndarray, pos: np.ndarray, neg: np.ndarray) -> pd.DataFrame:
+    """Confusion matrix and derived metrics at every threshold, predicting positive if score >= threshold
+    Args:
+        thresholds (np.ndarray): thresholds in decreasing order, from `score_counts`
+        pos (np.ndarray): number of positives at each threshold
+        neg (np.ndarray): number of negatives at each threshold
+    Returns:
+        curve (pd.DataFrame): one row per threshold with tp, fp, tn, fn, tpr, fpr, precision, accuracy and f1
+    """
+    tp = np.cumsum(pos)
+    fp = np.cumsum(neg)
+    n_pos, n_neg = tp[-1], fp[-1]
+    fn = n_pos - tp
+    tn = n_neg - fp
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 1.0)
+        tpr = tp / n_pos if n_pos else np.zeros(len(tp))
+        fpr = fp / n_neg if n_neg else np.zeros(len(fp))
+        f1 = np.where(precision + tpr > 0, 2 * precision * tpr / (precision + tpr), 0.0)
+
+    return pd.DataFrame({'threshold': thresholds, 'tp': tp, 'fp': fp, 'tn': tn, 'fn': fn,
+                         'tpr': tpr, 'fpr': fpr, 'precision': precision,
+                         'accuracy': (tp + tn) / (n_pos + n_neg), 'f1': f1})
+
+
+def summary_metrics(pos: np.ndarray, neg: np.ndarray, thresholds: np.ndarray, cut: float) -> dict:
+    """ROC AUC, average precision and accuracy at a cut from the per-threshold counts
+    Args:
+        pos (np.ndarray): number of positives at each threshold, thresholds decreasing
+        neg (np.ndarray): number of negatives at each threshold
+        thresholds (np.ndarray): thresholds in decreasing order
+        cut (float): probability above which an employee is predicted to leave
+    Returns:
+        metrics (dict): auc, average_precision and accuracy
+    """
+    tp = np.cumsum(pos)
+    fp = np.cumsum(neg)
+    n_pos, n_neg = tp[-1], fp[-1]
+    if n_pos == 0 or n_neg == 0:
+        raise ValueError("Both classes must be present to compute AUC")
+
+    # trapezoids between consecutive thresholds count tied scores as half right
+    tpr = np.concatenate([[0], tp / n_pos])
+    fpr = np.concatenate([[0], fp / n_neg])
+    auc = float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+    average_precision = float(np.sum(pos / n_pos * tp / np.maximum(tp + fp, 1)))
+
+    # thresholds decrease, so the ones above the cut are a prefix
+    above = np.count_nonzero(thresholds > cut)
+    tp_cut = tp[above - 1] if above else 0
+    fp_cut = fp[above - 1] if above else 0
+    accuracy = float(tp_cut + n_neg - fp_cut) / (n_pos + n_neg)
+    return {'auc': auc, 'average_precision': average_precision, 'accuracy': accuracy}
+
+
+def _bootstrap_chunk(pos: np.ndarray, neg: np.ndarray, thresholds: np.ndarray, cut: float, n_boot: int,
+                     seed: np.random.SeedSequence) -> typing.List[dict]:
+    """Resample the counts of each class `n_boot` times and compute the summary metrics."""
+    rng = np.random.default_rng(seed)
+    n_pos, n_neg = pos.sum(), neg.sum()
+    results = []
+    for _ in range(n_boot):
+        results.append(summary_metrics(rng.multinomial(n_pos, pos / n_pos), rng.multinomial(n_neg, neg / n_neg),
+                                       thresholds, cut))
+    return results
+
+
+def bootstrap_ci(pos: np.ndarray, neg: np.ndarray, thresholds: np.ndarray, cut: float, n_boot: int,
+                 alpha: float, n_jobs: int, random_state: int) -> dict:
+    """Stratified bootstrap confidence intervals of the summary metrics
+    Each class is resampled with replacement at its own size. Resampling the per-threshold counts is
+    equivalent to resampling rows, but costs one multinomial draw per distinct score instead of per row.
+    Args:
+        pos (np.ndarray): number of positives at each threshold, thresholds decreasing
+        neg (np.ndarray): number of negatives at each threshold
+        thresholds (np.ndarray): thresholds in decreasing order
+        cut (float): probability above which an employee is predicted to leave
+        n_boot (int): number of bootstrap replicates
+        alpha (float): the intervals cover 1 - alpha
+        n_jobs (int): number of parallel workers; -1 for all cores
+        random_state (int): random state
+    Returns:
+        intervals (dict): lower and upper bound of each metric
+    """
+    # fixed-size chunks with their own seeds keep the intervals independent of the number of workers
+    sizes = [min(BOOTSTRAP_CHUNK, n_boot - start) for start in range(0, n_boot, BOOTSTRAP_CHUNK)]
+    seeds = np.random.SeedSequence(random_state).spawn(len(sizes))
+    chunks = joblib.Parallel(n_jobs=n_jobs)(
+        joblib.delayed(_bootstrap_chunk)(pos, neg, thresholds, cut, size, seed) for size, seed in zip(sizes, seeds))
+
+    replicates = pd.DataFrame([result for chunk in chunks for result in chunk])
+    return {metric: {'lower': float(replicates[metric].quantile(alpha / 2)),
+                     'upper': float(replicates[metric].quantile(1 - alpha / 2))}
+            for metric in replicates.columns}
+
+
+def evaluate_scores(y_true: np.ndarray, scores: np.ndarray, cut: float = 0.5, n_bins: typing.Optional[int] = None,
+                    n_boot: int = 1000, alpha: float = 0.05, n_jobs: int = -1, random_state: int = 101,
+                    chunk_size: int = 1000000) -> [dict, pd.DataFrame]:
+    """Evaluate scored data at every threshold with bootstrap confidence intervals
+    Args:
+        y_true (np.ndarray): 0/1 labels
+        scores (np.ndarray): predicted probabilities, possibly memory-mapped
+        cut (float): probability above which an employee is predicted to leave
+        n_bins (int): number of score bins; exact thresholds for inputs of at most `chunk_size` rows if None
+        n_boot (int): number of bootstrap replicates; no intervals if 0
+        alpha (float): the intervals cover 1 - alpha
+        n_jobs (int): number of parallel bootstrap workers; -1 for all cores
+        random_state (int): random state of the bootstrap
+        chunk_size (int): rows read at a time when binning
+    Returns:
+        summary (dict): metrics, confusion matrix at `cut` and confidence intervals
+        curve (pd.DataFrame): ROC/PR curve and confusion matrix at every threshold
+    """
+    thresholds, pos, neg = score_counts(y_true, scores, n_bins=n_bins, chunk_size=chunk_size)
+    curve = threshold_table(thresholds, pos, neg)
+
+    above = np.count_nonzero(thresholds > cut)
+    n_pos, n_neg = int(pos.sum()), int(neg.sum())
+    tp = int(curve['tp'].iloc[above - 1]) if above else 0
+    fp = int(curve['fp'].iloc[above - 1]) if above else 0
+
+    summary = {'rows': n_pos + n_neg, 'positives': n_pos, 'cut': cut,
+               'confusion_matrix': {'tn': n_neg - fp, 'fp': fp, 'fn': n_pos - tp, 'tp': tp}}
+    summary.update(summary_metrics(pos, neg, thresholds, cut))
+    logger.info('AUC %0.3f, average precision %0.3f, accuracy at %s %0.3f over %s rows', summary['auc'],
+                summary['average_precision'], cut, summary['accuracy'], summary['rows'])
+
+    if n_boot > 0:
+        summary['confidence_intervals'] = bootstrap_ci(pos, neg, thresholds, cut, n_boot, alpha, n_jobs,
+                                                       random_state)
+        summary['confidence_level'] = 1 - alpha
+        logger.info('AUC %.0f%% confidence interval %0.3f-%0.3f', (1 - alpha) * 100,
+                    summary['confidence_intervals']['auc']['lower'],
+                    summary['confidence_intervals']['auc']['upper'])
+    return summary, curve
+
+
+def load_scores(path: str) -> np.ndarray:
+    """Memory-map a `.npy` file written by the score stage, loading other formats into memory
+    Args:
+        path (str): path of the saved array, or of a pickled pandas Series
+    Returns:
+        values (np.ndarray): the saved values
+    """
+    if os.path.splitext(path)[1] == '.npy':
+        return np.load(path, mmap_mode='r')
+    return pd.read_pickle(path).to_numpy()
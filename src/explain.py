@@ -0,0 +1,153 @@
+"""Per-prediction feature contributions of the random forest from its decision paths"""
+import collections
+import logging
+import threading
+import typing
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+from sklearn.ensemble import RandomForestClassifier
+
+logger = logging.getLogger(__name__)
+
+
+class ForestExplainer:
+    """
+    Splits each predicted attrition probability into a baseline plus one contribution per feature.
+    Every split on a decision path moves the probability from the parent node's value to the child's; the
+    move is credited to the feature split on. The moves of all nodes of all trees are cached in one sparse
+    (node x feature) matrix, so explaining a batch is one `decision_path` call and one sparse product.
+    Args:
+        final_rf (sklearn.RandomForestClassifier): trained random forest model
+        feature_columns (list(str)): columns of the training data, in order
+        cache_size (int): number of explained inputs kept for repeated requests
+    """
+
+    def __init__(self, final_rf: RandomForestClassifier, feature_columns: typing.List[str], cache_size: int = 1024):
+        n_features = final_rf.estimators_[0].tree_.n_features
+        if n_features != len(feature_columns):
+            raise ValueError("The model was trained on %s features, %s column names given"
+                             % (n_features, len(feature_columns)))
+        self.final_rf = final_rf
+        self.feature_columns = list(feature_columns)
+        # global feature importance, largest first, served at /importance
+        self.importances = pd.Series(final_rf.feature_importances_, index=self.feature_columns) \
+            .sort_values(ascending=False)
+
+        n_trees = len(final_rf.estimators_)
+        rows, cols, moves = [], [], []
+        self.bias = 0.0
+        offset = 0
+        for tree in final_rf.estimators_:
+            tree = tree.tree_
+            value = tree.value[:, 0, :]
+            prob = value[:, -1] / value.sum(axis=1)
+            internal = np.flatnonzero(tree.children_left != -1)
+            parent = np.full(tree.node_count, -1)
+            parent[tree.children_left[internal]] = internal
+            parent[tree.children_right[internal]] = internal
+            child = np.flatnonzero(parent >= 0)
+
+            rows.append(child + offset)
+            cols.append(tree.feature[parent[child]])
+            moves.append((prob[child] - prob[parent[child]]) / n_trees)
+            self.bias += prob[0] / n_trees
+            offset += tree.node_count
+
+        self._moves = scipy.sparse.csr_matrix(
+            (np.concatenate(moves), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(offset, len(self.feature_columns)))
+        self._cache = collections.OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        logger.debug('Explainer built over %s nodes of %s trees', offset, n_trees)
+
+    def explain(self, X: typing.Union[np.ndarray, pd.DataFrame]) -> pd.DataFrame:
+        """
+        Explain a batch of encoded inputs
+        Args:
+            X (np.ndarray or pd.DataFrame): encoded inputs in the order of the training columns
+        Returns:
+            contributions (pd.DataFrame): contribution of every feature to every prediction; each row plus
+                `bias` equals the predicted probability of attrition
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != len(self.feature_columns):
+            raise ValueError("Expected inputs with the %s training columns" % len(self.feature_columns))
+        # the input is checked above, so the trees' own checks (and feature name warnings) are skipped
+        indicator = scipy.sparse.hstack([tree.decision_path(X, check_input=False)
+                                         for tree in self.final_rf.estimators_]).tocsr()
+        return pd.DataFrame((indicator @ self._moves).toarray(), columns=self.feature_columns)
+
+    def explain_one(self, row: typing.Sequence[float]) -> typing.Dict[str, float]:
+        """
+        Explain one encoded input, reusing the result for inputs seen before
+        Args:
+            row (sequence(float)): encoded input in the order of the training columns
+        Returns:
+            contributions (dict): contribution of each feature to the predicted probability
+        """
+        key = tuple(float(value) for value in row)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        contributions = self.explain(np.array([key])).iloc[0].to_dict()
+        with self._lock:
+            self._cache[key] = contributions
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return contributions
+
+
+def top_contributions(contributions: typing.Dict[str, float], n: int = 3) -> typing.List[typing.Tuple[str, float]]:
+    """
+    Pick the features that moved a prediction the most
+    Args:
+        contributions (dict): contribution of each feature
+        n (int): number of features to return
+    Returns:
+        top (list(tuple)): (feature, contribution) pairs by decreasing absolute contribution
+    """
+    return sorted(contributions.items(), key=lambda item: abs(item[1]), reverse=True)[:n]
+
+
+class ExplainerCache:
+    """
+    Keeps one explainer per served model version, built on first use.
+    Args:
+        max_versions (int): number of versions kept, e.g. current and candidate
+        cache_size (int): number of explained inputs kept per version
+    """
+
+    def __init__(self, max_versions: int = 2, cache_size: int = 1024):
+        self.max_versions = max_versions
+        self.cache_size = cache_size
+        self._explainers = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str, final_rf: RandomForestClassifier,
+            feature_columns: typing.List[str]) -> ForestExplainer:
+        """
+        Get the explainer of a model version
+        Args:
+            name (str): name of the model version
+            final_rf (sklearn.RandomForestClassifier): model of the version
+            feature_columns (list(str)): columns of the training data, in order
+        Returns:
+            explainer (:obj:`ForestExplainer`): explainer of the version
+        """
+        with self._lock:
+            explainer = self._explainers.get(name)
+            if explainer is not None and explainer.final_rf is final_rf:
+                self._explainers.move_to_end(name)
+                return explainer
+
+        explainer = ForestExplainer(final_rf, feature_columns, cache_size=self.cache_size)
+        with self._lock:
+            self._explainers[name] = explainer
+            while len(self._explainers) > self.max_versions:
+                self._explainers.popitem(last=False)
+        return explainer
@@ -0,0 +1,239 @@
+"""Load generator for the Flask app with latency, throughput and consistency reporting"""
+import json
+import logging
+import threading
+import time
+import typing
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+logger = logging.getLogger(__name__)
+
+ORDINAL_FIELDS = {'EnvironmentSatisfaction': (1, 4),
+                  'JobInvolvement': (1, 4),
+                  'JobLevel': (1, 5),
+                  'JobSatisfaction': (1, 4),
+                  'PerformanceRating': (3, 4),
+                  'RelationshipSatisfaction': (1, 4),
+                  'WorkLifeBalance': (1, 4),
+                  'YearsSinceLastPromotion': (0, 15)}
+CATEGORICAL_FIELDS = {'MaritalStatus': ['Divorced', 'Single', 'Married'],
+                      'Gender': ['Male', 'Female'],
+                      'OverTime': ['Yes', 'No']}
+
+# markers of a successfully rendered page per route; routes not listed only need a 2xx status
+SUCCESS_MARKERS = {'/result': b'Probability of Attrition'}
+
+
+def random_form(rng: np.random.Generator) -> dict:
+    """Draw a valid employee form submission
+    Args:
+        rng (np.random.Generator): random generator
+    Returns:
+        form (dict): form fields as posted by app/templates/index.html
+    """
+    form = {col: str(rng.integers(low, high + 1)) for col, (low, high) in ORDINAL_FIELDS.items()}
+    form.update({col: levels[rng.integers(0, len(levels))] for col, levels in CATEGORICAL_FIELDS.items()})
+    return form
+
+
+def random_record(rng: np.random.Generator) -> dict:
+    """Draw a valid employee record as posted to /batch, with integer ordinal fields
+    Args:
+        rng (np.random.Generator): random generator
+    Returns:
+        record (dict): employee fields of the main page
+    """
+    record = random_form(rng)
+    record.update({col: int(record[col]) for col in ORDINAL_FIELDS})
+    return record
+
+
+class InProcessClient:
+    """Sends requests to a Flask app through its test client, one client per thread.
+    Args:
+        flask_app (:obj:`flask.app.Flask`): app to be load tested
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.local = threading.local()
+
+    def request(self, method: str, route: str, data: typing.Optional[dict] = None,
+                json_body: typing.Any = None) -> typing.Tuple[int, bytes]:
+        """Send one request
+        Args:
+            method (str): HTTP method
+            route (str): route of the app, e.g. '/result'
+            data (dict): form data of a POST
+            json_body: JSON body of a POST, e.g. the records of /batch
+        Returns:
+            (status, body) (tuple): HTTP status code and response body
+        """
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.flask_app.test_client()
+        response = self.local.client.open(route, method=method, data=data, json=json_body)
+        return response.status_code, response.data
+
+
+class HttpClient:
+    """Sends requests to a running app over HTTP.
+    Args:
+        base_url (str): address of the app, e.g. 'http://127.0.0.1:5000'
+        timeout (float): seconds before a request is abandoned
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method: str, route: str, data: typing.Optional[dict] = None,
+                json_body: typing.Any = None) -> typing.Tuple[int, bytes]:
+        """Send one request
+        Args:
+            method (str): HTTP method
+            route (str): route of the app, e.g. '/result'
+            data (dict): form data of a POST
+            json_body: JSON body of a POST, e.g. the records of /batch
+        Returns:
+            (status, body) (tuple): HTTP status code and response body
+        """
+        headers = {}
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        else:
+            body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + route, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def summarise(records: typing.List[dict], elapsed: float) -> dict:
+    """Summarise request records into latency percentiles, throughput and error rate
+    Args:
+        records (list(dict)): one record per request with `route`, `latency` and `ok`
+        elapsed (float): wall clock seconds of the whole run
+    Returns:
+        summary (dict): overall statistics plus one entry per route
+    """
+    def stats(subset: typing.List[dict]) -> dict:
+        latencies = np.array([r['latency'] for r in subset]) * 1000
+        errors = sum(not r['ok'] for r in subset)
+        return {'requests': len(subset),
+                'p50_ms': float(np.percentile(latencies, 50)),
+                'p95_ms': float(np.percentile(latencies, 95)),
+                'p99_ms': float(np.percentile(latencies, 99)),
+                'throughput_per_sec': len(subset) / elapsed,
+                'error_rate': errors / len(subset)}
+
+    if not records:
+        raise ValueError("No requests were recorded")
+
+    summary = stats(records)
+    summary['elapsed_sec'] = elapsed
+    summary['routes'] = {route: stats([r for r in records if r['route'] == route])
+                         for route in sorted({r['route'] for r in records})}
+    return summary
+
+
+def run_load_test(client, mix: typing.List[dict], n_requests: int, concurrency: int,
+                  random_state: int = 101) -> dict:
+    """Drive a request mix against the app with a fixed number of concurrent workers
+    Args:
+        client (:obj:`InProcessClient` or :obj:`HttpClient`): client used to send requests
+        mix (list(dict)): entries with `route`, `method` and `weight`; POSTs send a random employee form, or a
+            JSON list of `json_records` random employee records if the entry sets it (e.g. for /batch)
+        n_requests (int): total number of requests
+        concurrency (int): number of concurrent workers
+        random_state (int): random state of the request mix and forms
+    Returns:
+        summary (dict): output of `summarise`, plus the number of successful POSTs to /result
+    """
+    if concurrency <= 0 or n_requests <= 0:
+        raise ValueError("`concurrency` and `n_requests` must be positive")
+
+    rng = np.random.default_rng(random_state)
+    weights = np.array([entry['weight'] for entry in mix], dtype=float)
+    choices = rng.choice(len(mix), size=n_requests, p=weights / weights.sum())
+    plan = []
+    for i in choices:
+        entry = mix[i]
+        if entry['method'] != 'POST':
+            plan.append((entry, None))
+        elif entry.get('json_records'):
+            plan.append((entry, [random_record(rng) for _ in range(entry['json_records'])]))
+        else:
+            plan.append((entry, random_form(rng)))
+
+    def send(entry: dict, payload: typing.Any) -> dict:
+        start = time.perf_counter()
+        try:
+            if entry.get('json_records'):
+                status, body = client.request(entry['method'], entry['route'], json_body=payload)
+            else:
+                status, body = client.request(entry['method'], entry['route'], payload)
+            marker = SUCCESS_MARKERS.get(entry['route']) if entry['method'] == 'POST' else None
+            ok = 200 <= status < 300 and (marker is None or marker in body)
+        except Exception:
+            logger.debug('Request to %s failed', entry['route'], exc_info=True)
+            ok = False
+        return {'route': entry['route'], 'method': entry['method'],
+                'latency': time.perf_counter() - start, 'ok': ok}
+
+    logger.info('Sending %s requests with %s concurrent workers', n_requests, concurrency)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        records = list(executor.map(lambda item: send(*item), plan))
+    elapsed = time.perf_counter() - start
+
+    summary = summarise(records, elapsed)
+    summary['successful_posts'] = sum(r['ok'] for r in records
+                                      if r['route'] == '/result' and r['method'] == 'POST')
+    logger.info('%.1f requests/s, p50 %.1fms, p99 %.1fms, error rate %.2f%%', summary['throughput_per_sec'],
+                summary['p50_ms'], summary['p99_ms'], summary['error_rate'] * 100)
+    return summary
+
+
+def check_consistency(results_path: str, rows_before: int, successful_posts: int,
+                      engine_string: typing.Optional[str] = None) -> dict:
+    """Check the results file and Employee table after a load test
+    Args:
+        results_path (str): path of the results file written by the app
+        rows_before (int): number of rows in the results file before the load test
+        successful_posts (int): number of /result POSTs that rendered a prediction
+        engine_string (str): SQLAlchemy engine string of the app database; the table is skipped if None
+    Returns:
+        report (dict): row counts, duplicate `EmployeeNumber` values and file/table mismatches
+    """
+    results = pd.read_csv(results_path)
+    numbers = results['EmployeeNumber']
+    report = {'file_rows_added': len(results) - rows_before,
+              'successful_posts': successful_posts,
+              'lost_file_writes': successful_posts - (len(results) - rows_before),
+              'duplicate_employee_numbers': int(numbers.duplicated().sum())}
+
+    if engine_string is not None:
+        engine = sqlalchemy.create_engine(engine_string)
+        with engine.connect() as connection:
+            db_numbers = {row[0] for row in connection.execute(sqlalchemy.text(
+                'SELECT EmployeeNumber FROM Employee'))}
+        engine.dispose()
+        added = set(numbers.iloc[rows_before:])
+        report['db_rows'] = len(db_numbers)
+        report['file_rows_missing_in_db'] = len(added - db_numbers)
+
+    report['consistent'] = (report['duplicate_employee_numbers'] == 0 and report['lost_file_writes'] == 0
+                            and report.get('file_rows_missing_in_db', 0) == 0)
+    if not report['consistent']:
+        logger.warning('Inconsistent state after load test: %s', report)
+    return report
@@ -1,10 +1,15 @@
+import copy
+import json
 import logging
-from typing import List
+import os
+import time
+from typing import List, Optional
 
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 import pandas as pd
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, KFold, StratifiedKFold
+import joblib
 from sklearn import metrics
 
 logger = logging.getLogger(__name__)
@@ -80,31 +85,280 @@ def split_data(df_model: pd.DataFrame, test_size: float, random_state: int) \
     return [X_train, X_test, y_train, y_test]
 
 
+def feature_columns_path(X_path: str) -> str:
+    """Path of the column names saved next to a feature matrix or model, e.g. 'X_train.columns.json' for
+    'X_train.npy' and 'rf.columns.json' for 'rf.joblib'."""
+    return os.path.splitext(X_path)[0] + '.columns.json'
+
+
+def save_feature_columns(feature_columns: List[str], X_path: str) -> None:
+    """Save column names next to a feature matrix or model, which cannot hold them (see `feature_columns_path`)."""
+    with open(feature_columns_path(X_path), 'w') as f:
+        json.dump(list(feature_columns), f)
+
+
+def save_feature_matrix(X: pd.DataFrame, y: pd.Series, X_path: str, y_path: str, chunk_size: int = 100000) -> None:
+    """Save features as a contiguous float32, C-ordered `.npy` file that `train_model` reads without copies
+    The column names, which `.npy` files cannot hold, are saved next to it (see `feature_columns_path`).
+    Args:
+        X (pd.Dataframe): x variables
+        y (pd.Series): y variables, saved as int8
+        X_path (str): output path of the feature matrix
+        y_path (str): output path of the label vector
+        chunk_size (int): rows converted at a time, bounding the memory of the conversion
+    Returns:
+        None
+    """
+    X_map = np.lib.format.open_memmap(X_path, mode='w+', dtype=np.float32, shape=X.shape)
+    for start in range(0, len(X), chunk_size):
+        X_map[start:start + chunk_size] = X.iloc[start:start + chunk_size].to_numpy(dtype=np.float32)
+    X_map.flush()
+    del X_map
+    np.save(y_path, y.to_numpy(dtype=np.int8))
+    save_feature_columns(list(X.columns), X_path)
+    logger.debug('Saved %s x %s feature matrix to %s', X.shape[0], X.shape[1], X_path)
+
+
+def load_feature_matrix(X_path: str, y_path: str) -> [np.ndarray, np.ndarray]:
+    """Memory-map a feature matrix and label vector saved by `save_feature_matrix`
+    Args:
+        X_path (str): path of the feature matrix
+        y_path (str): path of the label vector
+    Returns:
+        X (np.memmap): read-only float32 feature matrix
+        y (np.memmap): read-only label vector
+    """
+    return np.load(X_path, mmap_mode='r'), np.load(y_path, mmap_mode='r')
+
+
+def load_feature_columns(X_path: str) -> Optional[List[str]]:
+    """Read the column names saved with a feature matrix or model
+    Args:
+        X_path (str): path of the feature matrix or model
+    Returns:
+        columns (list(str)): columns of the matrix, in order; None if they were not saved
+    """
+    try:
+        with open(feature_columns_path(X_path), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.warning('No column names saved with %s', X_path)
+        return None
+
+
 def train_model(X_train: pd.DataFrame, y_train: pd.Series, max_depth: int,
-                n_estimators: int, random_state: int) -> RandomForestClassifier:
+                n_estimators: int, random_state: int, max_samples: Optional[float] = None,
+                sample_weight: Optional[np.ndarray] = None) -> RandomForestClassifier:
     """
     train and save classifier model
     Args:
-        X_train(pd.Dataframe): x variables of train data
+        X_train(pd.Dataframe or np.ndarray): x variables of train data; a float32 C-ordered (memory-mapped)
+            array is used by sklearn without conversion copies
         y_train(pd.Series): y variables of test data
         n_estimators (int): number of trees in the forest
         max_depth (int): maximum depth of trees
         random_state (int): random state
+        max_samples (float): share of rows drawn with replacement for each tree; every tree sees all rows if
+            None. Fitting each tree is faster, but the drawn rows are spread over the whole matrix, so nearly
+            every page of a memory-mapped matrix is still read.
+        sample_weight (np.ndarray): weight of each row; rows with weight 0 are left out of every tree
     Returns:
         final_rf(sklearn.RandomForestClassifier): trained random forest model
     """
-
-    final_rf = RandomForestClassifier(bootstrap=False,
+    final_rf = RandomForestClassifier(bootstrap=max_samples is not None,
+                                      max_samples=max_samples,
                                       max_depth=max_depth,
                                       n_estimators=n_estimators,
                                       random_state=random_state)
-    final_rf.fit(X_train, y_train)
+    final_rf.fit(X_train, y_train, sample_weight=sample_weight)
 
     logger.info("Classifier model trained")
 
     return final_rf
 
 
+def feature_importance(final_rf: RandomForestClassifier, feature_columns: List[str]) -> pd.DataFrame:
+    """Global impurity-based importance of each feature
+    Args:
+        final_rf(sklearn.RandomForestClassifier): trained random forest model
+        feature_columns (list(str)): columns of the training data, in order
+    Returns:
+        importance (pd.DataFrame): features with their importance, most important first
+    """
+    importance = pd.DataFrame({'feature': feature_columns, 'importance': final_rf.feature_importances_})
+    return importance.sort_values('importance', ascending=False).reset_index(drop=True)
+
+
+def _fit_fold(X: np.ndarray, y: np.ndarray, folds: np.ndarray, fold: int, train_config: dict) -> dict:
+    """Fit one cross-validation fold on the shared matrix and score its held-out rows."""
+    held_out = folds == fold
+    start = time.perf_counter()
+    # weighting the held-out rows with 0 fits the fold without copying its training rows
+    fold_rf = train_model(X, y, sample_weight=(~held_out).astype(np.float64), **train_config)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ypred_proba = fold_rf.predict_proba(X[held_out])[:, 1]
+    predict_seconds = time.perf_counter() - start
+
+    y_held_out = np.asarray(y)[held_out]
+    return {'fold': fold, 'rows': int(held_out.sum()),
+            'auc': metrics.roc_auc_score(y_held_out, ypred_proba),
+            'accuracy': metrics.accuracy_score(y_held_out, ypred_proba > 0.5),
+            'fit_seconds': fit_seconds, 'predict_seconds': predict_seconds,
+            'ypred_proba': ypred_proba}
+
+
+def cross_validate(X: pd.DataFrame, y: pd.Series, n_splits: int, stratified: bool, n_jobs: int,
+                   random_state: int, train_config: dict) -> [pd.DataFrame, np.ndarray]:
+    """Cross-validate the classifier with folds fitted in parallel
+    The feature matrix is converted to float32 once (memory-mapped inputs are used as they are) and shared
+    read-only with the workers through joblib's automatic memory-mapping.
+    Args:
+        X(pd.Dataframe or np.ndarray): x variables
+        y(pd.Series or np.ndarray): y variables
+        n_splits (int): number of folds
+        stratified (bool): keep the attrition rate of every fold equal to the overall rate
+        n_jobs (int): number of folds fitted at once; -1 for all cores
+        random_state (int): random state of the fold assignment
+        train_config (dict): keyword arguments of `train_model` (config.yaml)
+    Returns:
+        result (pd.DataFrame): AUC, accuracy and timings per fold, followed by their mean and std
+        ypred_proba_oof (np.ndarray): out-of-fold predicted probability of every row
+    """
+    X = np.asarray(X, dtype=np.float32, order='C')
+    y = np.asarray(y)
+    splitter = (StratifiedKFold if stratified else KFold)(n_splits=n_splits, shuffle=True, random_state=random_state)
+    folds = np.empty(len(y), dtype=np.int8)
+    for fold, (_, test_index) in enumerate(splitter.split(np.zeros(len(y)), y)):
+        folds[test_index] = fold
+
+    results = joblib.Parallel(n_jobs=n_jobs)(
+        joblib.delayed(_fit_fold)(X, y, folds, fold, train_config) for fold in range(n_splits))
+
+    ypred_proba_oof = np.empty(len(y))
+    for fold_result in results:
+        ypred_proba_oof[folds == fold_result['fold']] = fold_result.pop('ypred_proba')
+
+    result = pd.DataFrame(results).set_index('fold')
+    result.loc['mean'] = result.mean()
+    result.loc['std'] = result.drop(index='mean').std()
+    logger.info("%s-fold AUC %0.3f +/- %0.3f", n_splits, result.loc['mean', 'auc'], result.loc['std', 'auc'])
+    return result, ypred_proba_oof
+
+
+def encode_features(data: pd.DataFrame, feature_columns: List[str]) -> pd.DataFrame:
+    """Encode raw employee records into the dummy columns the model was trained on
+    Unlike `pd.get_dummies`, every level is encoded against the trained columns, so a batch that lacks
+    some levels still yields the full feature matrix.
+    Args:
+        data (pd.DataFrame): employee records with the raw categorical columns
+        feature_columns (list(str)): columns of the training data, e.g. 'Gender_Male'
+    Returns:
+        encoded (pd.DataFrame): features in the order of `feature_columns`
+    """
+    encoded = pd.DataFrame(index=data.index)
+    for col in feature_columns:
+        if col in data.columns:
+            encoded[col] = data[col]
+        else:
+            base, level = col.rsplit('_', 1)
+            encoded[col] = (data[base] == level).astype('uint8')
+    return encoded
+
+
+def update_model(final_rf: RandomForestClassifier, X_new: pd.DataFrame, y_new: pd.Series,
+                 n_new_estimators: int) -> RandomForestClassifier:
+    """Grow an existing forest with trees fitted on new records only
+    Args:
+        final_rf(sklearn.RandomForestClassifier): trained random forest model; left unchanged
+        X_new(pd.Dataframe): x variables of the new records
+        y_new(pd.Series): y variables of the new records
+        n_new_estimators (int): number of trees to add
+    Returns:
+        updated_rf(sklearn.RandomForestClassifier): copy of the forest with the added trees
+    """
+    if set(np.unique(y_new)) != set(final_rf.classes_):
+        raise ValueError("New records must contain every class the model was trained on")
+
+    updated_rf = copy.deepcopy(final_rf)
+    updated_rf.set_params(warm_start=True, n_estimators=final_rf.n_estimators + n_new_estimators)
+    updated_rf.fit(X_new, y_new)
+    updated_rf.set_params(warm_start=False)
+
+    logger.info("Added %s trees fitted on %s new records", n_new_estimators, len(X_new))
+    return updated_rf
+
+
+def incremental_train(final_rf: RandomForestClassifier, results: pd.DataFrame, X_test: pd.DataFrame,
+                      y_test: pd.Series, watermark: int, n_new_estimators: int, min_new_rows: int,
+                      auc_tolerance: float, labels: Optional[pd.DataFrame] = None) \
+        -> [Optional[RandomForestClassifier], int, dict]:
+    """Refresh the model with the labelled employee records that arrived after the watermark
+    Employees scored by the app are written without `Attrition`; their observed outcomes come from `labels`.
+    Outcomes may arrive out of order, so only the records before the first one still without a label are
+    used, and the watermark stops just below it; the later records are used once it is labelled.
+    Args:
+        final_rf(sklearn.RandomForestClassifier): current random forest model
+        results (pd.DataFrame): employee records with `EmployeeNumber` (employee_results.csv)
+        X_test(pd.Dataframe): x variables of the holdout data
+        y_test(pd.Series): y variables of the holdout data
+        watermark (int): largest `EmployeeNumber` the current model has seen
+        n_new_estimators (int): number of trees to add
+        min_new_rows (int): fewest new records worth a refresh
+        auc_tolerance (float): largest holdout AUC drop accepted for publishing
+        labels (pd.DataFrame): observed `Attrition` per `EmployeeNumber`, replacing the column of `results`;
+            the `Attrition` of `results` is used if None
+    Returns:
+        updated_rf(sklearn.RandomForestClassifier): refreshed model, None if it should not be published
+        watermark (int): watermark of the returned model
+        result (dict): number of new and of labelled new records, and holdout AUC of both models
+    """
+    new = results[results['EmployeeNumber'] > watermark]
+    if labels is not None:
+        new = new.drop(columns=['Attrition'], errors='ignore') \
+            .merge(labels[['EmployeeNumber', 'Attrition']], on='EmployeeNumber', how='left')
+    elif 'Attrition' not in new.columns:
+        new = new.assign(Attrition=np.nan)
+    first_unlabelled = new.loc[new['Attrition'].isna(), 'EmployeeNumber'].min()
+    ready = new if pd.isna(first_unlabelled) else new[new['EmployeeNumber'] < first_unlabelled]
+    if len(ready) < len(new):
+        logger.info("EmployeeNumber %s has no Attrition label yet, the %s records from it on are kept for a later "
+                    "refresh", first_unlabelled, len(new) - len(ready))
+    next_watermark = int(ready['EmployeeNumber'].max()) if len(ready) else watermark
+    # only the label and the model inputs must be present; other columns may be missing
+    inputs = [col if col in new.columns else col.rsplit('_', 1)[0] for col in X_test.columns]
+    labelled = ready.dropna(subset=['Attrition'] + inputs)
+    result = {'new_rows': len(new), 'labelled_rows': len(labelled)}
+    if len(new) > 0 and len(labelled) == 0:
+        logger.warning("None of the %s new records after EmployeeNumber %s has an Attrition label, model not "
+                       "refreshed; pass the observed outcomes as labels", len(new), watermark)
+        return None, watermark, result
+    if len(labelled) < min_new_rows:
+        logger.info("Only %s labelled new records after EmployeeNumber %s, model not refreshed", len(labelled),
+                    watermark)
+        return None, watermark, result
+    new = labelled
+
+    X_new = encode_features(new, list(X_test.columns))
+    y_new = new['Attrition'].map({'Yes': 1, 'No': 0})
+    try:
+        updated_rf = update_model(final_rf, X_new, y_new, n_new_estimators)
+    except ValueError:
+        logger.warning("New records do not contain both attrition classes, model not refreshed")
+        return None, watermark, result
+
+    result['auc_current'] = metrics.roc_auc_score(y_test, final_rf.predict_proba(X_test)[:, 1])
+    result['auc_updated'] = metrics.roc_auc_score(y_test, updated_rf.predict_proba(X_test)[:, 1])
+    logger.info("Holdout AUC %0.3f for the current model, %0.3f for the refreshed model",
+                result['auc_current'], result['auc_updated'])
+    if result['auc_updated'] < result['auc_current'] - auc_tolerance:
+        logger.warning("Refreshed model is worse on the holdout data, model not refreshed")
+        return None, watermark, result
+
+    return updated_rf, next_watermark, result
+
+
 def predict(final_rf: RandomForestClassifier, X_test: pd.Series) -> [np.array, np.array]:
     """Make predictions on test data
        Args:
@@ -136,7 +390,7 @@ def evaluation(y_test: pd.Series, ypred_proba_test: np.array, ypred_bin_test: np
                           index=['Actual negative', 'Actual positive'],
                           columns=['Predicted negative', 'Predicted positive'])
 
-    print('AUC on test: %0.3f' % auc)
-    print('Accuracy on test: %0.3f' % accuracy)
-    print(result)
+    logger.info('AUC on test: %0.3f', auc)
+    logger.info('Accuracy on test: %0.3f', accuracy)
+    logger.info('Confusion matrix on test:\n%s', result)
     return result
@@ -1,11 +1,22 @@
+import functools
 import logging
+import typing
 
 import joblib
 import pandas as pd
 import numpy as np
 
+from config.flaskconfig import MaritalStatus, Gender, OverTime
+
 logger = logging.getLogger(__name__)
 
+# fields of the app form, as in the raw training data
+ORDINAL_FIELDS = ('EnvironmentSatisfaction', 'JobInvolvement', 'JobLevel', 'JobSatisfaction', 'PerformanceRating',
+                  'RelationshipSatisfaction', 'WorkLifeBalance', 'YearsSinceLastPromotion')
+CATEGORICAL_FIELDS = ('MaritalStatus', 'Gender', 'OverTime')
+# answers the app offers; other levels would encode like the dropped training level
+FIELD_LEVELS = {'MaritalStatus': MaritalStatus, 'Gender': Gender, 'OverTime': OverTime}
+
 
 def transform_input(ui_dict: dict) -> pd.DataFrame:
     """Transform the user input from the app to get predictions using the trained model
@@ -44,23 +55,26 @@ def transform_input(ui_dict: dict) -> pd.DataFrame:
     return df_new
 
 
-def prediction(input_df: pd.DataFrame, model_path='models/rf.joblib') -> [np.array, np.array]:
+def prediction(input_df: pd.DataFrame, model_path='models/rf.joblib', loaded_rf=None) -> [np.array, np.array]:
     """predcit attrition for new user input
     Args:
         input_df (pd.Dataframe): a DataFrame of transformed user input
         model_path (str): the path to trained model;
             default is 'models/randomforest.joblib' (config.yaml)
+        loaded_rf (sklearn.RandomForestClassifier): model already in memory, e.g. from
+            `src.registry.ModelStore`; `model_path` is not read if given
 
     Returns:
         [pred_label, pred_prob] (list of np.Array): the first object is a string indicating attrition
         and the second is a number indicating the probability of attrition
     """
     # load pre-trained model
-    try:
-        loaded_rf = joblib.load(model_path)
-        logger.info('Loaded model from %s', model_path)
-    except OSError:
-        logger.error('Model is not found from %s', model_path)
+    if loaded_rf is None:
+        try:
+            loaded_rf = joblib.load(model_path)
+            logger.info('Loaded model from %s', model_path)
+        except OSError:
+            logger.error('Model is not found from %s', model_path)
     # predict probability of attrition
     input_df = input_df.drop(columns=['EmployeeNumber'])
 
@@ -72,3 +86,112 @@ def prediction(input_df: pd.DataFrame, model_path='models/rf.joblib') -> [np.arr
     else:
         pred_label = "the employee is likely to leave"
     return [pred_label, pred_prob]
+
+
+class EmployeeRecord:
+    """One employee of the app form, with typed fields and no DataFrame behind it
+    Args:
+        **fields: the ordinal fields as integers and the categorical fields as strings, among `FIELD_LEVELS`
+    """
+    __slots__ = ORDINAL_FIELDS + CATEGORICAL_FIELDS
+
+    def __init__(self, **fields):
+        for name in ORDINAL_FIELDS:
+            setattr(self, name, int(fields[name]))
+        for name in CATEGORICAL_FIELDS:
+            value = str(fields[name])
+            if value not in FIELD_LEVELS[name]:
+                raise ValueError("%s must be one of %s, got %s" % (name, ', '.join(FIELD_LEVELS[name]), value))
+            setattr(self, name, value)
+
+    @classmethod
+    def from_form(cls, form: typing.Mapping[str, str]) -> 'EmployeeRecord':
+        """Read a record from the submitted form; raises KeyError or ValueError for missing or bad fields."""
+        return cls(**{name: form[name] for name in cls.__slots__})
+
+    def to_dict(self) -> dict:
+        """Fields of the record by name."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class RowEncoder:
+    """
+    Encodes records into the model's input row: ordinal fields as they are and one 0/1 value per dummy column
+    of the training data, e.g. `OverTime_Yes`. Dummy columns missing from the record's levels are 0, so
+    records with a dropped level (Female, Divorced, No overtime) get every training column.
+    Args:
+        feature_columns (list(str)): columns of the training data, in order
+    """
+
+    def __init__(self, feature_columns: typing.Sequence[str]):
+        self.feature_columns = list(feature_columns)
+        self._plan = []
+        for col in self.feature_columns:
+            if col in ORDINAL_FIELDS:
+                self._plan.append((col, None))
+                continue
+            field, _, level = col.rpartition('_')
+            if field not in CATEGORICAL_FIELDS:
+                raise ValueError("Training column %s is not a field of the app form" % col)
+            self._plan.append((field, level))
+
+    def encode(self, record: EmployeeRecord) -> np.ndarray:
+        """
+        Encode one record
+        Args:
+            record (:obj:`EmployeeRecord`): the employee
+        Returns:
+            row (np.ndarray): float32 array of shape (1, number of training columns)
+        """
+        return np.array([[getattr(record, field) if level is None else getattr(record, field) == level
+                          for field, level in self._plan]], dtype=np.float32)
+
+
+@functools.lru_cache(maxsize=8)
+def row_encoder(feature_columns: typing.Tuple[str, ...]) -> RowEncoder:
+    """Get the encoder of a set of training columns, built once per model version."""
+    return RowEncoder(feature_columns)
+
+
+def forest_proba(loaded_rf, X: np.ndarray) -> np.ndarray:
+    """Class probabilities of encoded rows, as `predict_proba` of the forest
+    The trees are called directly on the float32 rows, skipping the forest's input validation.
+    Args:
+        loaded_rf (sklearn.RandomForestClassifier): trained random forest model
+        X (np.ndarray): float32 rows from `RowEncoder.encode`, stacked
+    Returns:
+        proba (np.ndarray): probability of each class of `loaded_rf.classes_` for each row
+    """
+    proba = loaded_rf.estimators_[0].predict_proba(X, check_input=False)
+    for tree in loaded_rf.estimators_[1:]:
+        proba += tree.predict_proba(X, check_input=False)
+    proba /= len(loaded_rf.estimators_)
+    return proba
+
+
+def proba_label(loaded_rf, proba: np.ndarray) -> typing.Tuple[str, float]:
+    """Turn the class probabilities of one row into the prediction shown by the app
+    Args:
+        loaded_rf (sklearn.RandomForestClassifier): model that gave the probabilities
+        proba (np.ndarray): probability of each class for the row
+    Returns:
+        (pred_label, pred_prob) (tuple): sentence stating the predicted attrition and its probability,
+            as returned by `prediction`
+    """
+    if loaded_rf.classes_[np.argmax(proba)] == 0:
+        pred_label = "the employee is not likely to leave"
+    else:
+        pred_label = "the employee is likely to leave"
+    return pred_label, np.round(proba[1], 2)
+
+
+def predict_row(loaded_rf, row: np.ndarray) -> typing.Tuple[str, float]:
+    """Predict attrition for one encoded row
+    The label is taken from the same probabilities instead of a second pass over the forest.
+    Args:
+        loaded_rf (sklearn.RandomForestClassifier): trained random forest model
+        row (np.ndarray): output of `RowEncoder.encode`
+    Returns:
+        (pred_label, pred_prob) (tuple): sentence stating the predicted attrition and its probability
+    """
+    return proba_label(loaded_rf, forest_proba(loaded_rf, row)[0])
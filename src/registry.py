@@ -0,0 +1,226 @@
+"""Versioned model artifacts with an atomic "current" pointer and hot-swapping in the app"""
+import datetime
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import typing
+
+import joblib
+
+from src.model import load_feature_columns
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = 'rf.joblib'
+PREPROCESSOR_FILE = 'preprocessor.json'
+POINTER_FILE = 'CURRENT'
+
+
+class ModelVersion(typing.NamedTuple):
+    """A loaded model version; `version` is None for a model loaded outside the registry."""
+    version: typing.Optional[str]
+    model: typing.Any
+    feature_columns: typing.Optional[typing.List[str]]
+
+
+def publish_version(root: str, model_path: str, feature_columns: typing.List[str],
+                    metrics_paths: typing.Optional[typing.List[str]] = None) -> str:
+    """Copy a trained model, its preprocessor and evaluation metrics into a new version directory
+    The directory is assembled under a temporary name and renamed in one step, so a version is either
+    complete or absent.
+    Args:
+        root (str): directory holding all model versions, e.g. 'models/versions'
+        model_path (str): path of the trained model
+        feature_columns (list(str)): columns of the training data, in order
+        metrics_paths (list(str)): evaluation outputs to keep with the model
+    Returns:
+        version (str): name of the new version
+    """
+    os.makedirs(root, exist_ok=True)
+    version = datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
+    staging = os.path.join(root, '.%s.tmp' % version)
+    os.makedirs(staging)
+
+    shutil.copy(model_path, os.path.join(staging, MODEL_FILE))
+    with open(os.path.join(staging, PREPROCESSOR_FILE), 'w') as f:
+        json.dump({'feature_columns': list(feature_columns)}, f)
+    for path in metrics_paths or []:
+        shutil.copy(path, os.path.join(staging, os.path.basename(path)))
+
+    os.rename(staging, os.path.join(root, version))
+    logger.info('Model version %s published to %s', version, root)
+    return version
+
+
+def list_versions(root: str) -> typing.List[str]:
+    """List the published versions, oldest first
+    Args:
+        root (str): directory holding all model versions
+    Returns:
+        versions (list(str)): names of the published versions
+    """
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root)
+                  if not name.startswith('.') and os.path.isdir(os.path.join(root, name)))
+
+
+def current_version(root: str) -> typing.Optional[str]:
+    """Read the version the "current" pointer refers to
+    Args:
+        root (str): directory holding all model versions
+    Returns:
+        version (str): name of the current version, None if nothing has been promoted
+    """
+    try:
+        with open(os.path.join(root, POINTER_FILE), 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def promote(root: str, version: str) -> None:
+    """Point "current" at a published version, also used to roll back
+    Args:
+        root (str): directory holding all model versions
+        version (str): name of the version to serve
+    Returns:
+        None
+    """
+    if version not in list_versions(root):
+        raise ValueError("Model version %s is not published in %s" % (version, root))
+
+    staging = os.path.join(root, '.%s.tmp' % POINTER_FILE)
+    with open(staging, 'w') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(staging, os.path.join(root, POINTER_FILE))
+    logger.info('Model version %s promoted to current', version)
+
+
+def load_version(root: str, version: str) -> ModelVersion:
+    """Load a published model version
+    Args:
+        root (str): directory holding all model versions
+        version (str): name of the version
+    Returns:
+        model_version (:obj:`ModelVersion`): the loaded version
+    """
+    path = os.path.join(root, version)
+    model = joblib.load(os.path.join(path, MODEL_FILE))
+    with open(os.path.join(path, PREPROCESSOR_FILE), 'r') as f:
+        feature_columns = json.load(f)['feature_columns']
+    logger.info('Loaded model version %s', version)
+    return ModelVersion(version, model, feature_columns)
+
+
+class ModelStore:
+    """
+    Serves the current model version and swaps to a newly promoted one without a restart.
+    Each request takes one `ModelVersion` from `get` and uses it throughout, so a swap never mixes
+    versions within a request and the previous version stays in memory until its last request lets go.
+    A newly promoted version is loaded in a background thread; until it is ready, requests are served by
+    the version in memory, so no request waits for a load. Only the first model is loaded by the caller.
+    Args:
+        root (str): directory holding all model versions
+        fallback_path (str): model served while nothing has been promoted, e.g. 'models/rf.joblib'; its
+            training columns are read from next to it (`src.model.feature_columns_path`)
+        check_interval (float): seconds between checks of the "current" pointer
+        version (str): serve this published version instead of following the pointer
+    """
+
+    def __init__(self, root: str, fallback_path: typing.Optional[str] = None, check_interval: float = 1.0,
+                 version: typing.Optional[str] = None):
+        self.root = root
+        self.version = version
+        self.fallback_path = fallback_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._current = None
+        self._pointer_stamp = None
+        self._checked = 0.0
+
+    def get(self) -> ModelVersion:
+        """
+        Get the model version to serve a request with
+        Returns:
+            model_version (:obj:`ModelVersion`): the current version
+        """
+        if self._current is None:
+            self.refresh()
+        elif time.monotonic() - self._checked >= self.check_interval:
+            self._check_pointer()
+        if self._current is None:
+            raise RuntimeError("No model has been promoted in %s and no fallback model is set" % self.root)
+        return self._current
+
+    def refresh(self) -> None:
+        """
+        Load the promoted version if the pointer moved, in the calling thread. While a load is in progress,
+        other requests keep being served by the version already in memory.
+        Returns: None
+        """
+        if not self._lock.acquire(blocking=self._current is None):
+            return
+        try:
+            self._load()
+        finally:
+            self._lock.release()
+
+    def _check_pointer(self) -> None:
+        """Start loading the promoted version in a background thread if the pointer moved."""
+        if not self._lock.acquire(blocking=False):
+            return
+        self._checked = time.monotonic()
+        if self._stat_pointer() == self._pointer_stamp:
+            self._lock.release()
+            return
+        try:
+            threading.Thread(target=self._load_and_release, name='model-loader', daemon=True).start()
+        except RuntimeError:
+            self._lock.release()
+            raise
+
+    def _load_and_release(self) -> None:
+        try:
+            self._load()
+        finally:
+            self._lock.release()
+
+    def _stat_pointer(self) -> typing.Optional[tuple]:
+        try:
+            stat = os.stat(os.path.join(self.root, POINTER_FILE))
+            return stat.st_ino, stat.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self) -> None:
+        """Load the promoted version if the pointer moved; the caller holds the lock."""
+        self._checked = time.monotonic()
+        stamp = self._stat_pointer()
+        if self._current is not None and stamp == self._pointer_stamp:
+            return
+
+        version = self.version or current_version(self.root)
+        if self._current is not None and version is not None and version == self._current.version:
+            self._pointer_stamp = stamp
+            return
+        try:
+            if version is not None:
+                loaded = load_version(self.root, version)
+            elif self.fallback_path is not None:
+                loaded = ModelVersion(None, joblib.load(self.fallback_path),
+                                      load_feature_columns(self.fallback_path))
+                logger.info('Loaded model from %s', self.fallback_path)
+            else:
+                return
+        except (OSError, ValueError):
+            logger.error('Could not load model version %s, keeping the version in use', version, exc_info=True)
+            return
+
+        self._current = loaded
+        self._pointer_stamp = stamp
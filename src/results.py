@@ -0,0 +1,43 @@
+"""Appending scored app inputs to the local results file"""
+import csv
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ResultsFile:
+    """
+    Appends employees scored by the app to the results csv and numbers them. The file is read once at
+    startup for its columns and largest `EmployeeNumber`; afterwards each employee is one appended line,
+    and the next number is handed out and written under a lock, so concurrent requests neither lose rows
+    nor reuse numbers. Only one process may append to the file.
+    Args:
+        path (str): path of the results file, e.g. 'data/raw/employee_results.csv'
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        with open(path, 'r', newline='') as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames is None or 'EmployeeNumber' not in reader.fieldnames:
+                raise ValueError("%s has no EmployeeNumber column" % path)
+            self.fieldnames = reader.fieldnames
+            self._next_number = max((int(row['EmployeeNumber']) for row in reader), default=0) + 1
+        logger.debug('Results file %s opened, next EmployeeNumber %s', path, self._next_number)
+
+    def append(self, record: dict) -> int:
+        """
+        Number an employee and append it to the file
+        Args:
+            record (dict): employee fields; columns of the file missing from it, e.g. Attrition, are left empty
+        Returns:
+            number (int): the employee's `EmployeeNumber`
+        """
+        with self._lock:
+            number = self._next_number
+            with open(self.path, 'a', newline='') as f:
+                csv.DictWriter(f, self.fieldnames, extrasaction='ignore').writerow(dict(record, EmployeeNumber=number))
+            self._next_number += 1
+        return number
@@ -0,0 +1,220 @@
+"""Routing of app predictions between the current model and a candidate, with shadow scoring"""
+import collections
+import logging
+import random
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.model import encode_features, predict
+from src.predict import EmployeeRecord, predict_row, proba_label, row_encoder
+from src.registry import ModelVersion
+
+logger = logging.getLogger(__name__)
+
+
+def version_name(model_version: ModelVersion) -> str:
+    """Name a model version in metrics and records; models served outside the registry are 'default'."""
+    return model_version.version or 'default'
+
+
+def feature_columns(model_version: ModelVersion) -> typing.List[str]:
+    """
+    Get the training columns of a model version
+    Args:
+        model_version (:obj:`ModelVersion`): loaded model version
+    Returns:
+        columns (list(str)): training columns, from the preprocessor or the fitted model
+    """
+    if model_version.feature_columns is not None:
+        return model_version.feature_columns
+    if hasattr(model_version.model, 'feature_names_in_'):
+        return list(model_version.model.feature_names_in_)
+    raise ValueError("Training columns of model version %s are unknown" % version_name(model_version))
+
+
+class ServingMetrics:
+    """
+    Thread-safe latency and agreement statistics of the served and shadow models.
+    Args:
+        window (int): number of most recent latencies kept per model version and role
+    """
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._latency = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self._counts = collections.Counter()
+        self._compared = 0
+        self._disagreed = 0
+        self._prob_diff = 0.0
+        self._shadow_dropped = 0
+        self._candidate_unavailable = 0
+
+    def record_latency(self, version: str, role: str, seconds: float, rows: int = 1) -> None:
+        """Record one model call of the `served` or `shadow` role."""
+        with self._lock:
+            self._latency[(version, role)].append(seconds)
+            self._counts[(version, role)] += rows
+
+    def record_comparison(self, served_labels: np.ndarray, shadow_labels: np.ndarray,
+                          served_probs: np.ndarray, shadow_probs: np.ndarray) -> None:
+        """Record how often the shadow model disagrees with the served one."""
+        with self._lock:
+            self._compared += len(served_labels)
+            self._disagreed += int(np.sum(np.asarray(served_labels) != np.asarray(shadow_labels)))
+            self._prob_diff += float(np.sum(np.abs(np.asarray(served_probs) - np.asarray(shadow_probs))))
+
+    def record_shadow_dropped(self) -> None:
+        """Record a shadow call skipped because the shadow executor was full."""
+        with self._lock:
+            self._shadow_dropped += 1
+
+    def record_candidate_unavailable(self) -> None:
+        """Record a request served by the current model alone because the candidate could not be loaded."""
+        with self._lock:
+            self._candidate_unavailable += 1
+
+    def snapshot(self) -> dict:
+        """
+        Summarise the statistics collected so far
+        Returns:
+            summary (dict): rows scored and p50/p99 latency per model version and role, plus agreement
+        """
+        with self._lock:
+            models = {}
+            for (version, role), latencies in self._latency.items():
+                latencies_ms = np.array(latencies) * 1000
+                models.setdefault(version, {})[role] = {'rows': self._counts[(version, role)],
+                                                        'p50_ms': float(np.percentile(latencies_ms, 50)),
+                                                        'p99_ms': float(np.percentile(latencies_ms, 99))}
+            return {'models': models,
+                    'shadow': {'compared': self._compared,
+                               'disagreement_rate': self._disagreed / self._compared if self._compared else None,
+                               'mean_abs_prob_diff': self._prob_diff / self._compared if self._compared else None,
+                               'dropped': self._shadow_dropped,
+                               'candidate_unavailable': self._candidate_unavailable}}
+
+
+class ModelRouter:
+    """
+    Serves each request from the current model or, for a share of traffic, from a candidate version,
+    and scores the other model in the background for comparison. The shadow call runs in a bounded
+    executor and is skipped when the executor is full, so it never adds to the request latency. If the
+    candidate cannot be loaded, requests are served by the current model alone and the failure is counted.
+    Args:
+        primary (:obj:`src.registry.ModelStore`): store of the current model
+        candidate (:obj:`src.registry.ModelStore`): store of the candidate model; routing is off if None
+        candidate_percent (float): percentage of requests served by the candidate
+        max_workers (int): threads scoring shadow calls
+        max_pending (int): shadow calls queued or running before further ones are skipped
+        metrics (:obj:`ServingMetrics`): collected statistics
+        batcher (:obj:`src.batching.MicroBatcher`): scores served requests in micro-batches; one call each if None
+    """
+
+    def __init__(self, primary, candidate=None, candidate_percent: float = 0.0, max_workers: int = 2,
+                 max_pending: int = 100, metrics: typing.Optional[ServingMetrics] = None, batcher=None):
+        if not 0 <= candidate_percent <= 100:
+            raise ValueError("`candidate_percent` must be between 0 and 100")
+        self.primary = primary
+        self.candidate = candidate
+        self.candidate_percent = candidate_percent
+        self.metrics = metrics or ServingMetrics()
+        self.batcher = batcher
+        self._executor = ThreadPoolExecutor(max_workers=max_workers) if candidate is not None else None
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _route(self) -> typing.Tuple[ModelVersion, typing.Optional[ModelVersion]]:
+        """Pick the served and shadow model versions of one request."""
+        primary = self.primary.get()
+        if self.candidate is None:
+            return primary, None
+        try:
+            candidate = self.candidate.get()
+        except RuntimeError:
+            logger.warning('Candidate model unavailable, serving the current model only', exc_info=True)
+            self.metrics.record_candidate_unavailable()
+            return primary, None
+        if random.random() * 100 < self.candidate_percent:
+            return candidate, primary
+        return primary, candidate
+
+    def _submit_shadow(self, func: typing.Callable, *args) -> None:
+        """Run `func` in the shadow executor unless it is full."""
+        if not self._slots.acquire(blocking=False):
+            self.metrics.record_shadow_dropped()
+            return
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+
+    def score(self, record: EmployeeRecord) -> typing.Tuple[str, float, ModelVersion]:
+        """
+        Score one app input
+        Args:
+            record (:obj:`src.predict.EmployeeRecord`): the employee of the submitted form
+        Returns:
+            (label, prob, served) (tuple): prediction of the served model and the model version itself
+        """
+        served, shadow = self._route()
+        start = time.perf_counter()
+        row = row_encoder(tuple(feature_columns(served))).encode(record)
+        if self.batcher is not None:
+            label, prob = proba_label(served.model, self.batcher.predict_proba(served.model, row))
+        else:
+            label, prob = predict_row(served.model, row)
+        self.metrics.record_latency(version_name(served), 'served', time.perf_counter() - start)
+
+        if shadow is not None:
+            self._submit_shadow(self._shadow_score, shadow, record, label, prob)
+        return label, prob, served
+
+    def _shadow_score(self, shadow: ModelVersion, record: EmployeeRecord, label: str, prob: float) -> None:
+        try:
+            start = time.perf_counter()
+            row = row_encoder(tuple(feature_columns(shadow))).encode(record)
+            shadow_label, shadow_prob = predict_row(shadow.model, row)
+            self.metrics.record_latency(version_name(shadow), 'shadow', time.perf_counter() - start)
+            self.metrics.record_comparison([label], [shadow_label], [prob], [shadow_prob])
+        except Exception:
+            logger.warning('Shadow scoring with model version %s failed', version_name(shadow), exc_info=True)
+
+    def score_batch(self, records: pd.DataFrame) -> typing.Tuple[np.ndarray, np.ndarray, ModelVersion]:
+        """
+        Score a batch of raw employee records
+        Args:
+            records (pd.DataFrame): employee records with the app's form fields
+        Returns:
+            (probs, labels, served) (tuple): attrition probability and 0/1 label per record,
+                and the served model version
+        """
+        served, shadow = self._route()
+        start = time.perf_counter()
+        probs, labels = predict(served.model, encode_features(records, feature_columns(served)))
+        self.metrics.record_latency(version_name(served), 'served', time.perf_counter() - start, len(records))
+
+        if shadow is not None:
+            self._submit_shadow(self._shadow_score_batch, shadow, records, labels, probs)
+        return probs, labels, served
+
+    def _shadow_score_batch(self, shadow: ModelVersion, records: pd.DataFrame, labels: np.ndarray,
+                            probs: np.ndarray) -> None:
+        try:
+            start = time.perf_counter()
+            shadow_probs, shadow_labels = predict(shadow.model, encode_features(records, feature_columns(shadow)))
+            self.metrics.record_latency(version_name(shadow), 'shadow', time.perf_counter() - start, len(records))
+            self.metrics.record_comparison(labels, shadow_labels, probs, shadow_probs)
+        except Exception:
+            logger.warning('Shadow scoring with model version %s failed', version_name(shadow), exc_info=True)
+
+    def shutdown(self) -> None:
+        """
+        Wait for pending shadow calls and batches, and stop the executor and batcher
+        Returns: None
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self.batcher is not None:
+            self.batcher.shutdown()
@@ -0,0 +1,40 @@
+import pytest
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../src')
+from batching import MicroBatcher
+
+
+def test_micro_batcher():
+    """test1 (MicroBatcher.predict_proba()): happy path, concurrent rows are batched and each gets its own result"""
+    rng = np.random.default_rng(1)
+    X = rng.integers(0, 5, (40, 4)).astype(np.float32)
+    models = [RandomForestClassifier(n_estimators=5, random_state=seed).fit(X, rng.integers(0, 2, 40))
+              for seed in (1, 2)]
+
+    batcher = MicroBatcher(max_batch_size=8, max_wait_ms=50)
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        probas = list(executor.map(lambda i: batcher.predict_proba(models[i % 2], X[i:i + 1]), range(40)))
+    batcher.shutdown()
+    snapshot = batcher.metrics.snapshot()
+
+    for i, proba in enumerate(probas):
+        np.testing.assert_allclose(proba, models[i % 2].predict_proba(X[i:i + 1])[0])
+    assert snapshot['rows'] == 40
+    assert snapshot['batches'] < 40
+    assert max(int(size) for size in snapshot['batch_sizes']) <= 8
+
+
+def test_micro_batcher_bad():
+    """test2 (MicroBatcher): unhappy path, batches that cannot hold a row and rows sent after shutdown """
+    with pytest.raises(ValueError):
+        MicroBatcher(max_batch_size=0)
+
+    batcher = MicroBatcher()
+    batcher.shutdown()
+    with pytest.raises(RuntimeError):
+        batcher.predict_proba(None, np.zeros((1, 4), dtype=np.float32))
@@ -0,0 +1,36 @@
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../src')
+from benchmark import make_synthetic_employees, compare_to_baseline
+
+
+def test_make_synthetic_employees():
+    """test1 (make_synthetic_employees()): happy path for synthetic data"""
+    df_test = make_synthetic_employees(50, random_state=1, missing_rate=0.5)
+
+    assert len(df_test) == 50
+    assert df_test['EmployeeNumber'].is_unique
+    assert set(df_test['MaritalStatus']) <= {'Divorced', 'Married', 'Single'}
+    assert df_test['JobLevel'].between(1, 5).all()
+    assert df_test['Age'].isna().any()
+
+
+def test_make_synthetic_employees_bad():
+    """test2 (make_synthetic_employees()): unhappy path """
+    with pytest.raises(ValueError):
+        make_synthetic_employees(0)
+
+
+def test_compare_to_baseline():
+    """test3 (compare_to_baseline()): slower timings and lower throughput are regressions"""
+    baseline = {'1000/clean_data/seconds': 1.0, '1000/add_result/rows_per_sec': 100.0,
+                '1000/prediction/calls': 10}
+    results = {'1000/clean_data/seconds': 1.5, '1000/add_result/rows_per_sec': 50.0,
+               '1000/prediction/calls': 100, '1000/split_data/seconds': 9.0}
+
+    regressions = compare_to_baseline(results, baseline, tolerance=0.2)
+
+    assert len(regressions) == 2
+    assert compare_to_baseline(results, baseline, tolerance=1.0) == []
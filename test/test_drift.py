@@ -0,0 +1,37 @@
+import pytest
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../src')
+from drift import DriftMonitor, build_profile
+
+rng = np.random.default_rng(1)
+df_in = pd.DataFrame({'JobLevel': rng.integers(1, 6, 1000),
+                      'OverTime': rng.choice(['Yes', 'No'], 1000, p=[0.3, 0.7])})
+
+
+def test_drift_monitor():
+    """test1 (DriftMonitor): happy path, training-like inputs pass and shifted inputs are flagged"""
+    profile = build_profile(df_in, ['JobLevel'], ['OverTime'])
+    same = DriftMonitor(profile)
+    shifted = DriftMonitor(profile)
+    for record in df_in.to_dict('records'):
+        same.update(record)
+        # out-of-range levels land in the top bin and unseen answers in the other bin
+        shifted.update({'JobLevel': 9, 'OverTime': 'Sometimes'})
+
+    report = same.report()
+    assert report['observations'] == 1000
+    assert report['drifted'] == []
+    assert report['features']['JobLevel']['psi'] == pytest.approx(0)
+    assert report['features']['JobLevel']['ks'] == pytest.approx(0)
+    assert shifted.report()['drifted'] == ['JobLevel', 'OverTime']
+    assert shifted.report()['features']['JobLevel']['ks'] == pytest.approx(np.mean(df_in['JobLevel'] < 5))
+
+
+def test_build_profile_bad():
+    """test2 (build_profile()): unhappy path, monitored column missing from the training data """
+    with pytest.raises(KeyError):
+        build_profile(df_in, ['JobLevel', 'WorkLifeBalance'], ['OverTime'])
@@ -0,0 +1,96 @@
+import pytest
+import sys
+import os
+import json
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../src')
+import sqlalchemy
+from employee_db import create_db, create_indexes, EmployeeManager, ingest_files
+
+
+def make_manager(tmp_path):
+    engine_string = 'sqlite:///%s' % (tmp_path / 'employee.db')
+    create_db(engine_string)
+    manager = EmployeeManager(engine_string=engine_string)
+    for number in range(1, 8):
+        manager.add_employee(EmployeeNumber=number, EnvironmentSatisfaction=1, JobInvolvement=1,
+                             JobLevel=number % 2 + 1, JobSatisfaction=1, PerformanceRating=3,
+                             RelationshipSatisfaction=1, YearsSinceLastPromotion=0, WorkLifeBalance=1,
+                             MaritalStatus='Single', Gender='Male', OverTime='Yes',
+                             Attrition='Yes' if number % 3 == 0 else 'No')
+    return manager
+
+
+def test_query_employees(tmp_path):
+    """test1 (EmployeeManager.query_employees()): happy path, keyset pages cover every match once"""
+    manager = make_manager(tmp_path)
+
+    page1, after = manager.query_employees({'Attrition': 'No'}, limit=3)
+    page2, last = manager.query_employees({'Attrition': 'No'}, after=after, limit=3)
+
+    assert [e['EmployeeNumber'] for e in page1] == [1, 2, 4]
+    assert [e['EmployeeNumber'] for e in page2] == [5, 7]
+    assert last is None
+    assert manager.count_by('Attrition') == {'No': 5, 'Yes': 2}
+    assert manager.count_by('JobLevel', {'Attrition': 'Yes'}) == {'1': 1, '2': 1}
+
+    manager.count_cache_size = 2
+    for level in (1, 2, 3):
+        manager.count_by('Attrition', {'JobLevel': level})
+    assert len(manager._count_cache) == 2
+
+
+def test_query_employees_bad(tmp_path):
+    """test2 (EmployeeManager.query_employees()): unhappy path, column that cannot be filtered """
+    manager = make_manager(tmp_path)
+
+    with pytest.raises(ValueError):
+        manager.query_employees({'Age': 30})
+
+
+def test_create_indexes(tmp_path):
+    """test3 (create_indexes()): happy path, table of an earlier version gets its missing column and indexes"""
+    engine_string = 'sqlite:///%s' % (tmp_path / 'employee.db')
+    engine = sqlalchemy.create_engine(engine_string)
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text('CREATE TABLE "Employee" ("EmployeeNumber" INTEGER PRIMARY KEY, '
+                                     '"Attrition" VARCHAR(100), "OverTime" VARCHAR(100), "JobLevel" INTEGER)'))
+
+    create_indexes(engine_string)
+    create_indexes(engine_string)
+    inspector = sqlalchemy.inspect(engine)
+
+    assert 'ModelVersion' in {column['name'] for column in inspector.get_columns('Employee')}
+    assert 'ix_Employee_Attrition' in {index['name'] for index in inspector.get_indexes('Employee')}
+
+
+def test_ingest_files(tmp_path):
+    """test4 (ingest_files()): happy path, files load in parallel chunks and a rerun skips finished files"""
+    engine_string = 'sqlite:///%s' % (tmp_path / 'employee.db')
+    create_db(engine_string)
+    input_dir = tmp_path / 'results'
+    input_dir.mkdir()
+    for i in range(3):
+        numbers = range(i * 25 + 1, i * 25 + 26)
+        pd.DataFrame({'EmployeeNumber': numbers, 'JobLevel': 2, 'Gender': 'Male',
+                      'Attrition': [None if n % 5 == 0 else 'No' for n in numbers]}) \
+            .to_csv(input_dir / ('results_%s.csv' % i), index=False)
+    manifest_path = str(tmp_path / 'manifest.json')
+
+    summary = ingest_files(engine_string, str(input_dir), n_workers=2, chunk_size=10, manifest_path=manifest_path)
+    rerun = ingest_files(engine_string, str(input_dir / '*.csv'), manifest_path=manifest_path)
+    counts = EmployeeManager(engine_string=engine_string).count_by('Attrition')
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+
+    assert summary['rows'] == 75 and summary['files'] == 3 and summary['failed'] == []
+    assert rerun['skipped'] == 3 and rerun['rows'] == 0
+    assert counts == {'No': 60, None: 15}
+    assert sorted(manifest['finished'].values()) == [25, 25, 25]
+
+
+def test_ingest_files_bad(tmp_path):
+    """test5 (ingest_files()): unhappy path, no file matches the pattern """
+    with pytest.raises(FileNotFoundError):
+        ingest_files('sqlite:///%s' % (tmp_path / 'employee.db'), str(tmp_path / '*.csv'))
@@ -0,0 +1,35 @@
+import pytest
+import sys
+import os
+import numpy as np
+from sklearn import metrics
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../src')
+from evaluate import evaluate_scores, score_counts
+
+
+def test_evaluate_scores():
+    """test1 (evaluate_scores()): happy path, matches sklearn and binning is exact on a score grid"""
+    rng = np.random.default_rng(1)
+    y_true = rng.integers(0, 2, 500)
+    scores = np.clip(np.round(rng.normal(0.4 + 0.2 * y_true, 0.2), 2), 0, 1)
+
+    summary, curve = evaluate_scores(y_true, scores, n_boot=100, n_jobs=1)
+    summary_binned, _ = evaluate_scores(y_true, scores, n_bins=100, n_boot=0, chunk_size=64)
+    summary_long, curve_long = evaluate_scores(y_true, scores, n_boot=0, chunk_size=64)
+
+    assert summary['auc'] == pytest.approx(metrics.roc_auc_score(y_true, scores))
+    assert summary['average_precision'] == pytest.approx(metrics.average_precision_score(y_true, scores))
+    assert summary['accuracy'] == pytest.approx(metrics.accuracy_score(y_true, scores > 0.5))
+    assert summary['confidence_intervals']['auc']['lower'] < summary['auc']
+    assert summary['confidence_intervals']['auc']['upper'] > summary['auc']
+    assert summary_binned['auc'] == pytest.approx(summary['auc'])
+    # longer than one chunk, so binned by default
+    assert len(curve_long) == 10001 and summary_long['auc'] == pytest.approx(summary['auc'])
+    assert (curve['tp'] + curve['fn'] == y_true.sum()).all()
+
+
+def test_score_counts_bad():
+    """test2 (score_counts()): unhappy path, labels and scores of different lengths """
+    with pytest.raises(ValueError):
+        score_counts(np.array([0, 1, 1]), np.array([0.2, 0.8]))
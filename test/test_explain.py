@@ -0,0 +1,40 @@
+import pytest
+import sys
+import os
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../src')
+from explain import ForestExplainer, top_contributions
+
+
+def make_model():
+    rng = np.random.default_rng(1)
+    X = pd.DataFrame(rng.integers(1, 5, size=(60, 3)), columns=['JobLevel', 'JobSatisfaction', 'OverTime_Yes'])
+    y = (X['JobLevel'] + rng.integers(0, 3, 60) > 4).astype(int)
+    return RandomForestClassifier(n_estimators=10, max_depth=4, random_state=1).fit(X, y), X
+
+
+def test_forest_explainer():
+    """test1 (ForestExplainer): happy path, contributions add up to the predicted probability"""
+    final_rf, X = make_model()
+    explainer = ForestExplainer(final_rf, list(X.columns))
+
+    contributions = explainer.explain(X)
+    one = explainer.explain_one(X.iloc[0].values)
+
+    np.testing.assert_allclose(contributions.sum(axis=1) + explainer.bias, final_rf.predict_proba(X)[:, 1], atol=1e-9)
+    assert one == pytest.approx(contributions.iloc[0].to_dict())
+    assert explainer.explain_one(X.iloc[0].values) is one
+    assert top_contributions(one, n=1)[0][0] in X.columns
+    assert explainer.importances.index[0] == 'JobLevel'
+    assert explainer.importances.sum() == pytest.approx(1)
+
+
+def test_forest_explainer_bad():
+    """test2 (ForestExplainer): unhappy path, column names do not match the model """
+    final_rf, X = make_model()
+
+    with pytest.raises(ValueError):
+        ForestExplainer(final_rf, ['JobLevel'])
@@ -0,0 +1,38 @@
+import pytest
+import sys
+import os
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../src')
+from load_test import random_form, summarise
+
+
+def test_random_form():
+    """test1 (random_form()): happy path for a random employee form"""
+    form = random_form(np.random.default_rng(1))
+
+    assert len(form) == 11
+    assert 1 <= int(form['JobLevel']) <= 5
+    assert form['MaritalStatus'] in ['Divorced', 'Single', 'Married']
+
+
+def test_summarise():
+    """test2 (summarise()): happy path for latency and error summary"""
+    records = [{'route': '/', 'latency': 0.01, 'ok': True},
+               {'route': '/result', 'latency': 0.02, 'ok': True},
+               {'route': '/result', 'latency': 0.04, 'ok': False},
+               {'route': '/result', 'latency': 0.03, 'ok': True}]
+
+    summary = summarise(records, elapsed=2.0)
+
+    assert summary['requests'] == 4
+    assert summary['throughput_per_sec'] == 2.0
+    assert summary['error_rate'] == 0.25
+    assert summary['routes']['/result']['p50_ms'] == pytest.approx(30.0)
+    assert summary['routes']['/']['error_rate'] == 0
+
+
+def test_summarise_bad():
+    """test3 (summarise()): unhappy path """
+    with pytest.raises(ValueError):
+        summarise([], elapsed=1.0)
@@ -5,7 +5,8 @@ import pandas as pd
 import numpy as np
 
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../src')
-from model import clean_data
+from model import clean_data, encode_features, update_model, incremental_train, train_model, save_feature_matrix, \
+    load_feature_matrix, load_feature_columns, cross_validate
 
 
 def test_clean_data():
@@ -53,3 +54,101 @@ def test_clean_data_bad():
 
     with pytest.raises(TypeError):
         clean_data(input, missing_col, columns, output_path='')
+
+
+def test_encode_features():
+    """test3 (encode_features()): levels missing from the batch still get their dummy column"""
+    input = pd.DataFrame([[2, 'Female', 'Single', 'No'], [3, 'Male', 'Single', 'Yes']],
+                         columns=['JobLevel', 'Gender', 'MaritalStatus', 'OverTime'])
+    feature_columns = ['JobLevel', 'Gender_Male', 'MaritalStatus_Married', 'MaritalStatus_Single', 'OverTime_Yes']
+
+    df_true = pd.DataFrame([[2, 0, 0, 1, 0], [3, 1, 0, 1, 1]], columns=feature_columns)
+    df_test = encode_features(input, feature_columns)
+
+    assert (df_test.values == df_true.values).all()
+    assert list(df_test.columns) == feature_columns
+
+
+def test_update_model():
+    """test4 (update_model()): trees are added to a copy, single-class records are rejected"""
+    X = pd.DataFrame({'JobLevel': [1, 2, 3, 4]})
+    final_rf = train_model(X, pd.Series([0, 1, 0, 1]), max_depth=2, n_estimators=3, random_state=1)
+
+    with pytest.raises(ValueError):
+        update_model(final_rf, X, pd.Series([0, 0, 0, 0]), n_new_estimators=2)
+
+    updated_rf = update_model(final_rf, X, pd.Series([1, 0, 1, 0]), n_new_estimators=2)
+    assert len(updated_rf.estimators_) == 5
+    assert len(final_rf.estimators_) == 3
+
+
+def test_save_feature_matrix(tmp_path):
+    """test5 (save_feature_matrix()): memory-mapped float32 matrix trains the same forest as the DataFrame"""
+    X = pd.DataFrame({'JobLevel': [1, 2, 3, 4, 5, 2], 'OverTime_Yes': [1, 0, 1, 0, 1, 1]})
+    y = pd.Series([1, 0, 1, 0, 1, 0])
+    X_path, y_path = str(tmp_path / 'X.npy'), str(tmp_path / 'y.npy')
+
+    save_feature_matrix(X, y, X_path, y_path, chunk_size=4)
+    X_map, y_map = load_feature_matrix(X_path, y_path)
+
+    assert X_map.dtype == np.float32 and X_map.flags['C_CONTIGUOUS']
+    assert (X_map == X.values).all() and (y_map == y.values).all()
+    rf_map = train_model(X_map, y_map, max_depth=3, n_estimators=5, random_state=1)
+    rf_df = train_model(X, y, max_depth=3, n_estimators=5, random_state=1)
+    assert (rf_map.predict_proba(X.values) == rf_df.predict_proba(X.values)).all()
+
+    assert load_feature_columns(X_path) == list(X.columns)
+
+
+def test_cross_validate():
+    """test6 (cross_validate()): every row gets an out-of-fold prediction and per-fold metrics"""
+    X = pd.DataFrame({'JobLevel': [1, 2, 3, 4, 5, 1, 2, 3, 4, 5], 'OverTime_Yes': [1, 0, 1, 0, 1, 0, 1, 0, 1, 0]})
+    y = pd.Series([1, 0, 1, 0, 1, 0, 1, 0, 1, 0])
+    train_config = {'max_depth': 3, 'n_estimators': 5, 'random_state': 1}
+
+    result, ypred_proba_oof = cross_validate(X, y, n_splits=2, stratified=True, n_jobs=1, random_state=1,
+                                             train_config=train_config)
+
+    assert list(result.index) == [0, 1, 'mean', 'std']
+    assert result.loc[[0, 1], 'rows'].sum() == 10
+    assert len(ypred_proba_oof) == 10
+    assert ((ypred_proba_oof >= 0) & (ypred_proba_oof <= 1)).all()
+
+
+def test_incremental_train_labels():
+    """test7 (incremental_train()): app records without Attrition are labelled from the outcomes"""
+    X_test = pd.DataFrame({'JobLevel': [1, 2, 3, 4], 'OverTime_Yes': [1, 0, 1, 0]})
+    y_test = pd.Series([1, 0, 1, 0])
+    final_rf = train_model(X_test, y_test, max_depth=2, n_estimators=3, random_state=1)
+    # scored by the app: no Attrition, and an unrelated column with missing values
+    results = pd.DataFrame({'EmployeeNumber': range(1, 11), 'JobLevel': [1, 2, 3, 4, 5] * 2,
+                            'OverTime': ['Yes', 'No'] * 5, 'Attrition': np.nan, 'Age': np.nan})
+    labels = pd.DataFrame({'EmployeeNumber': range(1, 9), 'Attrition': ['Yes', 'No'] * 4})
+
+    unlabelled = incremental_train(final_rf, results, X_test, y_test, 0, 2, 1, 1.0)
+    updated_rf, watermark, result = incremental_train(final_rf, results, X_test, y_test, 0, 2, 1, 1.0,
+                                                      labels=labels)
+
+    assert unlabelled[0] is None and unlabelled[2] == {'new_rows': 10, 'labelled_rows': 0}
+    assert result['labelled_rows'] == 8
+    assert watermark == 8
+    assert len(updated_rf.estimators_) == 5
+
+
+def test_incremental_train_out_of_order():
+    """test8 (incremental_train()): records labelled out of order, the watermark waits for the missing label"""
+    X_test = pd.DataFrame({'JobLevel': [1, 2, 3, 4], 'OverTime_Yes': [1, 0, 1, 0]})
+    y_test = pd.Series([1, 0, 1, 0])
+    final_rf = train_model(X_test, y_test, max_depth=2, n_estimators=3, random_state=1)
+    results = pd.DataFrame({'EmployeeNumber': range(1, 7), 'JobLevel': [1, 2, 3, 4, 5, 1],
+                            'OverTime': ['Yes', 'No'] * 3, 'Attrition': np.nan})
+    # the outcome of employee 3 arrives after those of 4 to 6
+    early = pd.DataFrame({'EmployeeNumber': [1, 2, 4, 5, 6], 'Attrition': ['Yes', 'No', 'Yes', 'No', 'Yes']})
+    late = pd.concat([early, pd.DataFrame({'EmployeeNumber': [3], 'Attrition': ['No']})])
+
+    _, first, first_result = incremental_train(final_rf, results, X_test, y_test, 0, 2, 1, 1.0, labels=early)
+    _, second, second_result = incremental_train(final_rf, results, X_test, y_test, first, 2, 1, 1.0,
+                                                 labels=late)
+
+    assert first == 2 and first_result['labelled_rows'] == 2
+    assert second == 6 and second_result['labelled_rows'] == 4
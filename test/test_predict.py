@@ -2,10 +2,12 @@
 import pytest
 import sys
 import os
+import numpy as np
 import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
 
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../src')
-from predict import transform_input
+from predict import EmployeeRecord, RowEncoder, predict_row, transform_input
 
 
 
@@ -37,3 +39,38 @@ def test_transform_input_bad():
 
     with pytest.raises(ValueError):
         transform_input(sample_input)
+
+
+def test_row_encoder():
+    """test3 (RowEncoder.encode(), predict_row()): happy path, dropped levels match the training dummies"""
+    form = {'EnvironmentSatisfaction': '2', 'JobInvolvement': '3', 'JobLevel': '1', 'JobSatisfaction': '4',
+            'PerformanceRating': '3', 'RelationshipSatisfaction': '2', 'WorkLifeBalance': '3',
+            'YearsSinceLastPromotion': '5', 'MaritalStatus': 'Divorced', 'Gender': 'Female', 'OverTime': 'No'}
+    columns = ['EnvironmentSatisfaction', 'JobInvolvement', 'JobLevel', 'JobSatisfaction', 'PerformanceRating',
+               'RelationshipSatisfaction', 'WorkLifeBalance', 'YearsSinceLastPromotion', 'Gender_Male',
+               'MaritalStatus_Married', 'MaritalStatus_Single', 'OverTime_Yes']
+    row = RowEncoder(columns).encode(EmployeeRecord.from_form(form))
+
+    X = pd.DataFrame([[2, 3, 1, 4, 3, 2, 3, 5, 0, 0, 0, 0], [1, 1, 2, 1, 4, 1, 1, 0, 1, 1, 0, 1]], columns=columns)
+    model = RandomForestClassifier(n_estimators=5, random_state=1).fit(X, [1, 0])
+    label, prob = predict_row(model, row)
+
+    assert row.dtype == np.float32
+    assert (row == X.iloc[[0]].to_numpy()).all()
+    assert prob == np.round(model.predict_proba(X.iloc[[0]])[0][1], 2)
+    assert label == "the employee is likely to leave"
+
+
+def test_row_encoder_bad():
+    """test4 (RowEncoder): unhappy path, training column that is not a form field """
+    with pytest.raises(ValueError):
+        RowEncoder(['JobLevel', 'Department_Sales'])
+
+
+def test_employee_record_bad():
+    """test5 (EmployeeRecord.from_form()): unhappy path, answer the app does not offer """
+    form = {'EnvironmentSatisfaction': '2', 'JobInvolvement': '3', 'JobLevel': '1', 'JobSatisfaction': '4',
+            'PerformanceRating': '3', 'RelationshipSatisfaction': '2', 'WorkLifeBalance': '3',
+            'YearsSinceLastPromotion': '0', 'MaritalStatus': 'Single', 'Gender': 'Other', 'OverTime': 'No'}
+    with pytest.raises(ValueError):
+        EmployeeRecord.from_form(form)
@@ -0,0 +1,42 @@
+import pytest
+import sys
+import os
+import time
+import joblib
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../src')
+from registry import ModelStore, publish_version, promote, current_version, list_versions
+
+
+def test_model_store_swap(tmp_path):
+    """test1 (ModelStore): happy path, promoted versions are swapped in and requests keep their version"""
+    root = str(tmp_path / 'versions')
+    for name in ['first', 'second']:
+        joblib.dump({'name': name}, str(tmp_path / ('%s.joblib' % name)))
+    (tmp_path / 'metrics.csv').write_text('auc\n0.9\n')
+
+    first = publish_version(root, str(tmp_path / 'first.joblib'), ['JobLevel'], [str(tmp_path / 'metrics.csv')])
+    promote(root, first)
+    store = ModelStore(root, check_interval=0)
+    in_flight = store.get()
+
+    second = publish_version(root, str(tmp_path / 'second.joblib'), ['JobLevel'])
+    promote(root, second)
+
+    # the second version is loaded in the background while requests are still served
+    deadline = time.monotonic() + 5
+    while store.get().model != {'name': 'second'} and time.monotonic() < deadline:
+        assert store.get().model in ({'name': 'first'}, {'name': 'second'})
+        time.sleep(0.01)
+
+    assert list_versions(root) == [first, second]
+    assert current_version(root) == second
+    assert os.path.exists(os.path.join(root, first, 'metrics.csv'))
+    assert store.get().model == {'name': 'second'}
+    assert in_flight.model == {'name': 'first'}
+
+
+def test_promote_bad(tmp_path):
+    """test2 (promote()): unhappy path, unknown version """
+    with pytest.raises(ValueError):
+        promote(str(tmp_path), 'not-a-version')
@@ -0,0 +1,32 @@
+import pytest
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../src')
+from results import ResultsFile
+
+
+def test_results_file_append(tmp_path):
+    """test1 (ResultsFile.append()): happy path, concurrent appends get consecutive numbers and no row is lost"""
+    path = str(tmp_path / 'employee_results.csv')
+    pd.DataFrame({'JobLevel': [1, 2], 'Attrition': ['No', 'Yes'], 'EmployeeNumber': [5, 9]}).to_csv(path, index=False)
+
+    results_file = ResultsFile(path)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        numbers = list(executor.map(lambda level: results_file.append({'JobLevel': level}), range(40)))
+    df_out = pd.read_csv(path)
+
+    assert sorted(numbers) == list(range(10, 50))
+    assert len(df_out) == 42
+    assert df_out['EmployeeNumber'].is_unique
+    assert df_out['Attrition'].isna().sum() == 40
+
+
+def test_results_file_bad(tmp_path):
+    """test2 (ResultsFile): unhappy path, file without an EmployeeNumber column """
+    path = str(tmp_path / 'employee_results.csv')
+    pd.DataFrame({'JobLevel': [1, 2]}).to_csv(path, index=False)
+    with pytest.raises(ValueError):
+        ResultsFile(path)
@@ -0,0 +1,66 @@
+import pytest
+import sys
+import os
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../src')
+from serving import ModelRouter
+from registry import ModelVersion
+
+
+class StaticStore:
+    """Model store that always serves the same version"""
+
+    def __init__(self, model_version):
+        self.model_version = model_version
+
+    def get(self):
+        return self.model_version
+
+
+def make_store(version, random_state):
+    X = pd.DataFrame({'JobLevel': [1, 2, 3, 4, 5, 1], 'OverTime_Yes': [1, 0, 1, 0, 1, 0]})
+    model = RandomForestClassifier(n_estimators=3, random_state=random_state).fit(X, [1, 0, 1, 0, 1, 1])
+    return StaticStore(ModelVersion(version, model, list(X.columns)))
+
+
+def test_score_batch_shadow():
+    """test1 (ModelRouter.score_batch()): candidate serves all traffic, current model is shadow scored"""
+    router = ModelRouter(make_store('current', 1), make_store('candidate', 2), candidate_percent=100)
+    records = pd.DataFrame({'JobLevel': [1, 4, 5], 'OverTime': ['Yes', 'No', 'Yes']})
+
+    probs, labels, served = router.score_batch(records)
+    router.shutdown()
+    snapshot = router.metrics.snapshot()
+
+    assert served.version == 'candidate'
+    assert len(probs) == len(labels) == 3
+    assert snapshot['models']['candidate']['served']['rows'] == 3
+    assert snapshot['models']['current']['shadow']['rows'] == 3
+    assert snapshot['shadow']['compared'] == 3
+
+
+def test_score_candidate_unavailable():
+    """test2 (ModelRouter.score_batch()): broken candidate, current model serves alone and the failure is counted"""
+    class BrokenStore:
+        def get(self):
+            raise RuntimeError("No model has been promoted")
+
+    router = ModelRouter(make_store('current', 1), BrokenStore(), candidate_percent=100)
+    records = pd.DataFrame({'JobLevel': [1, 4, 5], 'OverTime': ['Yes', 'No', 'Yes']})
+
+    probs, labels, served = router.score_batch(records)
+    router.shutdown()
+    snapshot = router.metrics.snapshot()
+
+    assert served.version == 'current'
+    assert len(probs) == 3
+    assert snapshot['shadow']['candidate_unavailable'] == 1
+    assert snapshot['shadow']['compared'] == 0
+
+
+def test_model_router_bad():
+    """test3 (ModelRouter): unhappy path, traffic percentage out of range """
+    with pytest.raises(ValueError):
+        ModelRouter(make_store('current', 1), candidate_percent=150)